@@ -4,8 +4,8 @@ import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.neighbors import BallTree
 from scipy.sparse import hstack, csr_matrix
-import math
 
 # ================= Utility Functions =================
 @st.cache_data
@@ -21,15 +21,13 @@ def load_data(uploaded_file):
     st.write(f"✅ Dataset loaded! Shape: {df.shape}")
     return df
 
-def haversine(lon1, lat1, lon2, lat2):
-    """Distance between two lat/lon points in km."""
-    R = 6371.0
-    lon1, lat1, lon2, lat2 = map(math.radians, [lon1, lat1, lon2, lat2])
-    dlon = lon2 - lon1
-    dlat = lat2 - lat1
-    a = math.sin(dlat/2)*2 + math.cos(lat1)*math.cos(lat2)*math.sin(dlon/2)*2
-    c = 2*math.atan2(math.sqrt(a), math.sqrt(1-a))
-    return R * c
+@st.cache_resource
+def build_spatial_index(df):
+    """Haversine BallTree over restaurant coordinates for radius queries."""
+    coords = df[['latitude', 'longitude']].to_numpy(dtype=float)
+    positions = np.flatnonzero(~np.isnan(coords).any(axis=1))
+    tree = BallTree(np.radians(coords[positions]), metric='haversine')
+    return tree, positions
 
 @st.cache_data
 def build_feature_matrix(df):
@@ -66,23 +64,19 @@ def compute_similarity(feature_matrix):
     similarity = cosine_similarity(feature_matrix, feature_matrix)
     return similarity
 
-def recommend(df, similarity, idx, topn=10, user_loc=None, radius_km=None):
+def recommend(df, similarity, idx, topn=10, user_loc=None, radius_km=None, spatial_index=None):
     """Get top-n similar restaurants with optional location filter."""
-    sim_scores = list(enumerate(similarity[idx]))
-    sim_scores = sorted(sim_scores, key=lambda x: x[1], reverse=True)
-    recs = []
-
-    for i, score in sim_scores[1:]:  # skip itself
-        if user_loc and radius_km:
-            dist = haversine(user_loc[1], user_loc[0], df.loc[i, 'longitude'], df.loc[i, 'latitude'])
-            if dist > radius_km:
-                continue
-        recs.append((i, score))
-        if len(recs) >= topn:
-            break
-
-    rec_indices = [i for i, _ in recs]
-    return df.iloc[rec_indices].assign(similarity=[s for _, s in recs])
+    order = np.argsort(-similarity[idx], kind='stable')[1:]  # skip itself
+
+    if user_loc and radius_km:
+        tree, positions = spatial_index if spatial_index is not None else build_spatial_index(df)
+        nearby = tree.query_radius(np.radians([user_loc]), r=radius_km / 6371.0)[0]
+        in_radius = np.zeros(len(df), dtype=bool)
+        in_radius[positions[nearby]] = True
+        order = order[in_radius[order]]
+
+    rec_indices = order[:topn]
+    return df.iloc[rec_indices].assign(similarity=similarity[idx][rec_indices])
 
 # ================= Streamlit App =================
 def main():
@@ -114,15 +108,17 @@ def main():
     num_recs = st.sidebar.slider("Number of recommendations", 1, 20, 5)
 
     use_location = st.sidebar.checkbox("Filter by distance (km)")
-    user_lat = user_lon = radius_km = None
+    user_lat = user_lon = radius_km = spatial_index = None
     if use_location:
         user_lat = st.sidebar.number_input("Your latitude", value=float(df['latitude'].median()) if 'latitude' in df.columns else 0.0)
         user_lon = st.sidebar.number_input("Your longitude", value=float(df['longitude'].median()) if 'longitude' in df.columns else 0.0)
         radius_km = st.sidebar.slider("Radius (km)", 1, 50, 10)
+        spatial_index = build_spatial_index(df)
 
     idx = df.index[df['name'] == restaurant][0]
     user_loc = (user_lat, user_lon) if use_location else None
-    recs = recommend(df, similarity, idx, topn=num_recs, user_loc=user_loc, radius_km=radius_km)
+    recs = recommend(df, similarity, idx, topn=num_recs, user_loc=user_loc, radius_km=radius_km,
+                     spatial_index=spatial_index)
 
     # Display selected restaurant
     st.subheader("📍 Selected Restaurant")
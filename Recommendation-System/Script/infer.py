@@ -1,117 +1,308 @@
-import sys
-import json
-import pickle
-import warnings
-warnings.filterwarnings('ignore')
-
-
-def load_model(model_path):
-    """Load the trained restaurant recommender model"""
-    with open(model_path, 'rb') as f:
-        return pickle.load(f)
-
-
-def match_any(field_value, filters):
-    """Helper: TRUE if `field_value` matches ANY value in list."""
-    if isinstance(filters, list):
-        for f in filters:
-            if f.lower() in str(field_value).lower():
-                return True
-        return False
-    else:
-        return filters.lower() in str(field_value).lower()
-
-
-def filter_by_preferences(df, prefs):
-    """Apply user filters before similarity/location ranking"""
-    filtered = df.copy()
-
-    # MULTI-SELECT cuisine filter
-    if prefs.get("cuisine_type"):
-        filtered = filtered[
-            filtered["cuisine_type"].apply(lambda x: match_any(x, prefs["cuisine_type"]))
-        ]
-
-    # Rating
-    if prefs.get("min_rating"):
-        filtered = filtered[filtered["rating"] >= prefs["min_rating"]]
-
-    # Budget
-    if prefs.get("budget_filter"):
-        filtered = filtered[filtered["price_level"] == prefs["budget_filter"]]
-
-    # MULTI-SELECT atmosphere
-    if prefs.get("atmosphere_filter"):
-        filtered = filtered[
-            filtered["atmosphere"].apply(lambda x: match_any(x, prefs["atmosphere_filter"]))
-        ]
-
-    # MULTI-SELECT amenities
-    if prefs.get("amenities_filter"):
-        filtered = filtered[
-            filtered["amenities"].apply(lambda x: match_any(x, prefs["amenities_filter"]))
-        ]
-
-    # MULTI-SELECT restaurant type
-    if prefs.get("restaurant_type_filter"):
-        filtered = filtered[
-            filtered["restaurant_type"].apply(lambda x: match_any(x, prefs["restaurant_type_filter"]))
-        ]
-
-    return filtered
-
-
-def rank_restaurants(model, filtered_df, n):
-    """Rank restaurants using similarity_matrix + location_matrix"""
-
-    similarity_matrix = model["similarity_matrix"]
-    location_matrix = model["location_matrix"]
-
-    scores = []
-
-    for idx, row in filtered_df.iterrows():
-
-        content_score = similarity_matrix[idx].mean()
-        location_score = location_matrix[idx].mean() if location_matrix is not None else 0.0
-
-        final_score = 0.65 * content_score + 0.35 * location_score
-
-        scores.append((row['place_id'], final_score))
-
-    scores = sorted(scores, key=lambda x: x[1], reverse=True)
-
-    return [pid for pid, _ in scores[:n]]
-
-
-def main():
-    """Reads JSON input from backend and returns place_ids"""
-    
-    model_path = "restaurant_recommender_fixed.pkl"
-
-    # Read POSTed JSON from backend
-    prefs_json = sys.stdin.read().strip()
-    prefs = json.loads(prefs_json)
-
-    # Load model
-    model = load_model(model_path)
-    df = model["df"]
-
-    # Filter based on user preferences
-    filtered_df = filter_by_preferences(df, prefs)
-
-    if len(filtered_df) == 0:
-        print(json.dumps({"place_ids": []}))
-        return
-
-    # Rank and get top results
-    top_ids = rank_restaurants(
-        model=model,
-        filtered_df=filtered_df,
-        n=prefs.get("n", 10)
-    )
-
-    print(json.dumps({"place_ids": top_ids}, indent=2))
-
-
-if __name__ == "__main__":
-    main()
+import os
+import sys
+import json
+import pickle
+import warnings
+import numpy as np
+import pandas as pd
+warnings.filterwarnings('ignore')
+
+# Preference keys and the comma-separated column each one is matched against
+FILTER_COLUMNS = {
+    "cuisine_type": "cuisine_type",
+    "atmosphere_filter": "atmosphere",
+    "amenities_filter": "amenities",
+    "restaurant_type_filter": "restaurant_type",
+}
+
+
+# Highest on-disk artifact layout (see RestaurantRecommender.save_artifact) this script reads
+ARTIFACT_SCHEMA_VERSION = 1
+
+
+def load_artifact(model_dir):
+    """Load the parts of a model artifact directory that inference needs
+
+    Arrays are memory-mapped read-only, so resident workers share them through
+    the page cache instead of each holding a private copy.
+    """
+    with open(os.path.join(model_dir, "manifest.json"), encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    if manifest["schema_version"] > ARTIFACT_SCHEMA_VERSION:
+        raise ValueError(f"Unsupported model schema version: {manifest['schema_version']}")
+
+    def load_array(name):
+        return np.load(os.path.join(model_dir, f"{name}.npy"), mmap_mode="r")
+
+    model = {"df": pd.read_parquet(os.path.join(model_dir, "restaurants.parquet"))}
+
+    for name in ("content_scores", "location_scores"):
+        if name in manifest["arrays"]:
+            model[name] = load_array(name)
+
+    filter_index = manifest.get("filter_index")
+    if filter_index is not None:
+        model["filter_index"] = {
+            "tokens": {
+                col: dict(zip(values, load_array(f"filter.{col}")))
+                for col, values in filter_index["tokens"].items()
+            },
+            "price_level": dict(zip(filter_index["price_levels"], load_array("filter.price_level"))),
+            "rating_order": load_array("filter.rating_order"),
+            "rating_sorted": load_array("filter.rating_sorted"),
+        }
+
+    return model
+
+
+def load_model(model_path):
+    """Load the trained restaurant recommender model (pickle file or artifact directory)"""
+    if os.path.isdir(model_path):
+        model = load_artifact(model_path)
+    else:
+        with open(model_path, 'rb') as f:
+            model = pickle.load(f)
+
+    # Older artifacts predate the stored score vectors; derive them once here
+    if model.get("content_scores") is None:
+        model["content_scores"] = model["similarity_matrix"].mean(axis=1)
+    if model.get("location_scores") is None:
+        location_matrix = model.get("location_matrix")
+        model["location_scores"] = (
+            location_matrix.mean(axis=1) if location_matrix is not None else np.zeros(len(model["df"]))
+        )
+    if model.get("filter_index") is None:
+        model["filter_index"] = build_filter_index(model["df"])
+
+    # Final ranking score per restaurant, shared by every request
+    model["scores"] = 0.65 * model["content_scores"] + 0.35 * model["location_scores"]
+    model["place_ids"] = model["df"]["place_id"].to_numpy()
+
+    return model
+
+
+def build_filter_index(df):
+    """Tokenize categorical columns into one boolean mask per distinct value"""
+    n_rows = len(df)
+
+    tokens = {}
+    for col in FILTER_COLUMNS.values():
+        masks = {}
+        values = df[col].fillna("").astype(str).str.lower().str.split(",")
+        for pos, row_tokens in enumerate(values):
+            for token in row_tokens:
+                token = token.strip()
+                if token:
+                    masks.setdefault(token, np.zeros(n_rows, dtype=bool))[pos] = True
+        tokens[col] = masks
+
+    price_levels = df["price_level"].to_numpy()
+    price_masks = {int(level): price_levels == level for level in np.unique(price_levels)}
+
+    ratings = df["rating"].to_numpy(dtype=float)
+    rated = np.flatnonzero(~np.isnan(ratings))
+    rating_order = rated[np.argsort(ratings[rated], kind="stable")]
+
+    return {
+        "tokens": tokens,
+        "price_level": price_masks,
+        "rating_order": rating_order,
+        "rating_sorted": ratings[rating_order],
+    }
+
+
+def match_any(masks, filters, n_rows):
+    """Helper: mask of rows with a value that matches ANY value in list."""
+    if not isinstance(filters, list):
+        filters = [filters]
+
+    mask = np.zeros(n_rows, dtype=bool)
+    for f in filters:
+        f = f.lower()
+        for token, token_mask in masks.items():
+            if f in token:
+                mask |= token_mask
+    return mask
+
+
+def rating_at_least(index, min_rating, n_rows):
+    """Helper: mask of rows rated at least `min_rating`, via the sorted rating order."""
+    start = np.searchsorted(index["rating_sorted"], min_rating, side="left")
+    mask = np.zeros(n_rows, dtype=bool)
+    mask[index["rating_order"][start:]] = True
+    return mask
+
+
+def cached_mask(cache, key, build):
+    """Helper: reuse a filter mask already built for another request in the batch."""
+    if cache is None:
+        return build()
+    if key not in cache:
+        cache[key] = build()
+    return cache[key]
+
+
+def filter_by_preferences(model, prefs, cache=None):
+    """Apply user filters before similarity/location ranking
+
+    Returns a boolean candidate mask built from the precompiled filter index.
+    Pass a dict as `cache` to share per-filter masks across a batch of requests.
+    """
+    index = model["filter_index"]
+    n_rows = len(model["df"])
+    mask = np.ones(n_rows, dtype=bool)
+
+    # MULTI-SELECT cuisine, atmosphere, amenities and restaurant type
+    for pref_key, column in FILTER_COLUMNS.items():
+        filters = prefs.get(pref_key)
+        if filters:
+            key = (column, tuple(filters) if isinstance(filters, list) else filters)
+            mask &= cached_mask(cache, key, lambda: match_any(index["tokens"][column], filters, n_rows))
+
+    # Rating
+    min_rating = prefs.get("min_rating")
+    if min_rating:
+        mask &= cached_mask(cache, ("rating", min_rating), lambda: rating_at_least(index, min_rating, n_rows))
+
+    # Budget
+    if prefs.get("budget_filter"):
+        mask &= index["price_level"].get(prefs["budget_filter"], np.zeros(n_rows, dtype=bool))
+
+    return mask
+
+
+def rank_restaurants(model, candidates, n):
+    """Rank restaurants using the precomputed content and location score vectors"""
+    positions = np.flatnonzero(candidates)
+
+    scores = model["scores"][positions]
+
+    n = min(n, len(scores))
+    if n <= 0:
+        return []
+
+    # Partial top-n selection, then order just those n (ties keep dataset order)
+    top = np.sort(np.argpartition(-scores, n - 1)[:n])
+    top = top[np.argsort(-scores[top], kind="stable")]
+
+    return model["place_ids"][positions[top]].tolist()
+
+
+def recommend(model, prefs, cache=None):
+    """Filter and rank restaurants for a single preference payload"""
+    candidates = filter_by_preferences(model, prefs, cache)
+
+    if not candidates.any():
+        return []
+
+    return rank_restaurants(
+        model=model,
+        candidates=candidates,
+        n=prefs.get("n", 10)
+    )
+
+
+def recommend_batch(model, requests):
+    """Filter and rank many preference payloads in one call
+
+    Results are keyed by each request's "request_id" (or its position in the
+    batch). A request whose key is already taken is not run; the clash is
+    reported under "errors" for that key and the first request's results stay.
+    Filter masks are built once and shared by every request using them.
+    """
+    cache = {}
+    results = {}
+    errors = {}
+    positions = {}
+
+    for position, prefs in enumerate(requests):
+        request_id = str(prefs.get("request_id", position))
+        if request_id in positions:
+            clash = (f"duplicate request_id {request_id!r}: request at position {position} was not run "
+                     f"(position {positions[request_id]} already uses it)")
+            errors[request_id] = f"{errors[request_id]}; {clash}" if request_id in errors else clash
+            continue
+        positions[request_id] = position
+        try:
+            results[request_id] = recommend(model, prefs, cache)
+        except Exception as e:
+            results[request_id] = []
+            errors[request_id] = str(e)
+
+    response = {"results": results}
+    if errors:
+        response["errors"] = errors
+    return response
+
+
+def read_batch(text):
+    """Parse a batch given either as a JSON array or as JSON Lines"""
+    text = text.strip()
+    if text.startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def serve(model):
+    """Answer newline-delimited JSON requests on stdin until EOF
+
+    Prints a readiness line once the model is loaded, then exactly one
+    JSON line per request so the caller can keep the process resident.
+    """
+    print(json.dumps({"status": "ready"}), flush=True)
+
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+
+        try:
+            request = json.loads(line)
+            if isinstance(request, list):
+                response = recommend_batch(model, request)
+            else:
+                response = {"place_ids": recommend(model, request)}
+        except Exception as e:
+            response = {"place_ids": [], "error": str(e)}
+
+        print(json.dumps(response), flush=True)
+
+
+def main():
+    """Reads JSON input from backend and returns place_ids
+
+    Run with --serve to keep the model loaded and answer one request per line
+    (a JSON array on one line is answered as a batch), or with --batch to answer
+    a JSON array / JSON Lines stream of requests in one go.
+    """
+
+    # Prefer the memory-mappable artifact directory when it has been deployed
+    model_path = "restaurant_recommender_fixed"
+    if not os.path.isdir(model_path):
+        model_path += ".pkl"
+
+    if "--serve" in sys.argv[1:]:
+        serve(load_model(model_path))
+        return
+
+    if "--batch" in sys.argv[1:]:
+        requests = read_batch(sys.stdin.read())
+        print(json.dumps(recommend_batch(load_model(model_path), requests)))
+        return
+
+    # Read POSTed JSON from backend
+    prefs_json = sys.stdin.read().strip()
+    prefs = json.loads(prefs_json)
+
+    # Load model
+    model = load_model(model_path)
+
+    # Filter and rank based on user preferences
+    top_ids = recommend(model, prefs)
+
+    print(json.dumps({"place_ids": top_ids}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,13 +2,25 @@ import sys
 import json
 import pickle
 import warnings
+import numpy as np
 warnings.filterwarnings('ignore')
 
 
 def load_model(model_path):
     """Load the trained restaurant recommender model"""
     with open(model_path, 'rb') as f:
-        return pickle.load(f)
+        model = pickle.load(f)
+
+    # Older artifacts predate the stored score vectors; derive them once here
+    if model.get("content_scores") is None:
+        model["content_scores"] = model["similarity_matrix"].mean(axis=1)
+    if model.get("location_scores") is None:
+        location_matrix = model.get("location_matrix")
+        model["location_scores"] = (
+            location_matrix.mean(axis=1) if location_matrix is not None else np.zeros(len(model["df"]))
+        )
+
+    return model
 
 
 def filter_by_preferences(df, prefs):
@@ -46,29 +58,20 @@ def filter_by_preferences(df, prefs):
 
 
 def rank_restaurants(model, filtered_df, n):
-    """Rank restaurants using similarity_matrix + location_matrix"""
-
-    similarity_matrix = model["similarity_matrix"]
-    location_matrix = model["location_matrix"]
-
-    scores = []
-
-    for idx, row in filtered_df.iterrows():
-
-        # Take the MEAN similarity to all restaurants as the content score
-        content_score = similarity_matrix[idx].mean()
-
-        # Take the MEAN location similarity to all restaurants
-        location_score = location_matrix[idx].mean() if location_matrix is not None else 0.0
+    """Rank restaurants using the precomputed content and location score vectors"""
+    positions = filtered_df.index.to_numpy()
 
-        final_score = 0.65 * content_score + 0.35 * location_score
+    scores = 0.65 * model["content_scores"][positions] + 0.35 * model["location_scores"][positions]
 
-        scores.append((row['place_id'], final_score))
+    n = min(n, len(scores))
+    if n <= 0:
+        return []
 
-    # Sort by score
-    scores = sorted(scores, key=lambda x: x[1], reverse=True)
+    # Partial top-n selection, then order just those n (ties keep dataset order)
+    top = np.sort(np.argpartition(-scores, n - 1)[:n])
+    top = top[np.argsort(-scores[top], kind="stable")]
 
-    return [pid for pid, _ in scores[:n]]
+    return filtered_df["place_id"].to_numpy()[top].tolist()
 
 
 def main():
@@ -3,6 +3,7 @@ import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 from sklearn.preprocessing import MinMaxScaler
+from sklearn.neighbors import BallTree
 from scipy.sparse import csr_matrix
 from scipy.sparse.linalg import svds
 import pickle
@@ -35,6 +36,7 @@ class RestaurantRecommender:
         self.svd_model = None
         self.user_similarity_matrix = None
         self.item_similarity_matrix = None
+        self.spatial_index = None
         
     def haversine_distance(self, lat1, lon1, lat2, lon2):
         """Calculate distance between two points on Earth using Haversine formula (in km)"""
@@ -47,24 +49,41 @@ class RestaurantRecommender:
         distance = R * c
         return distance
     
-    def calculate_distance_matrix(self):
-        """Calculate distance matrix between all restaurants"""
-        n = len(self.df)
-        distance_matrix = np.zeros((n, n))
-        
-        for i in range(n):
-            for j in range(n):
-                if i != j:
-                    distance_matrix[i, j] = self.haversine_distance(
-                        self.df.iloc[i]['latitude'],
-                        self.df.iloc[i]['longitude'],
-                        self.df.iloc[j]['latitude'],
-                        self.df.iloc[j]['longitude']
-                    )
-        
-        # Convert distance to similarity (closer = more similar)
+    def haversine_vectorized(self, lat1, lon1, lat2, lon2):
+        """Vectorized Haversine distance (in km); array inputs broadcast against each other"""
+        R = 6371  # Earth's radius in kilometers
+        lat1, lon1, lat2, lon2 = map(np.radians, [lat1, lon1, lat2, lon2])
+        dlat = lat2 - lat1
+        dlon = lon2 - lon1
+        a = np.sin(dlat/2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon/2)**2
+        a = np.clip(a, 0, 1)
+        c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1-a))
+        return R * c
+    
+    def calculate_distance_matrix(self, dtype=np.float64, block_size=2048):
+        """Calculate location similarity between all restaurants
+        
+        Distances are computed with NumPy broadcasting, `block_size` rows at a time
+        to cap peak memory. Pass dtype=np.float32 to halve the size of the stored result.
+        """
+        latitudes = self.df['latitude'].to_numpy(dtype=float)
+        longitudes = self.df['longitude'].to_numpy(dtype=float)
+        n = len(latitudes)
+        
         scale = 5.0  # 5km scale factor
-        location_sim = np.exp(-distance_matrix / scale)
+        location_sim = np.empty((n, n), dtype=dtype)
+        
+        for block_start in range(0, n, block_size):
+            block_end = min(block_start + block_size, n)
+            distances = self.haversine_vectorized(
+                latitudes[block_start:block_end, None],
+                longitudes[block_start:block_end, None],
+                latitudes[None, :],
+                longitudes[None, :]
+            )
+            location_sim[block_start:block_end] = np.exp(-distances / scale)
+        
+        np.fill_diagonal(location_sim, 1.0)
         return location_sim
         
     def preprocess_data(self):
@@ -91,9 +110,33 @@ class RestaurantRecommender:
         # Process reviews - aggregate by restaurant
         self._process_reviews()
         
+        # Index coordinates once so radius queries only visit nearby restaurants
+        self.build_spatial_index()
+        
         print("Data preprocessing complete!")
         return self
     
+    def build_spatial_index(self):
+        """Build a haversine BallTree over restaurant coordinates"""
+        coords = self.df[['latitude', 'longitude']].to_numpy(dtype=float)
+        positions = np.flatnonzero(~np.isnan(coords).any(axis=1))
+        
+        self.spatial_index = {
+            'tree': BallTree(np.radians(coords[positions]), metric='haversine'),
+            'positions': positions
+        }
+        return self
+    
+    def query_radius(self, latitude, longitude, radius_km):
+        """Return positions and distances (km) of restaurants within radius, nearest first"""
+        R = 6371  # Earth's radius in kilometers
+        point = np.radians([[latitude, longitude]])
+        
+        ind, dist = self.spatial_index['tree'].query_radius(
+            point, r=radius_km / R, return_distance=True, sort_results=True
+        )
+        return self.spatial_index['positions'][ind[0]], dist[0] * R
+    
     def _process_reviews(self):
         """Process and aggregate review data"""
         # Calculate review-based features
@@ -514,32 +557,18 @@ class RestaurantRecommender:
     
     def get_nearby_restaurants(self, latitude, longitude, radius_km=5, n=10, min_rating=None):
         """Find restaurants near a given location"""
-        distances = []
+        positions, distances = self.query_radius(latitude, longitude, radius_km)
         
-        for idx, restaurant in self.df.iterrows():
-            distance = self.haversine_distance(
-                latitude, longitude,
-                restaurant['latitude'],
-                restaurant['longitude']
-            )
-            
-            if distance <= radius_km:
-                if min_rating is None or restaurant['rating'] >= min_rating:
-                    distances.append({
-                        'name': restaurant['name'],
-                        'cuisine_type': restaurant['cuisine_type'],
-                        'rating': restaurant['rating'],
-                        'review_count': restaurant['review_count'],
-                        'price_range': restaurant['price_range'],
-                        'address': restaurant['address'],
-                        'distance_km': round(distance, 2),
-                        'latitude': restaurant['latitude'],
-                        'longitude': restaurant['longitude']
-                    })
+        if min_rating is not None:
+            keep = self.df['rating'].to_numpy()[positions] >= min_rating
+            positions, distances = positions[keep], distances[keep]
+        positions, distances = positions[:n], distances[:n]
         
-        distances_df = pd.DataFrame(distances)
-        if len(distances_df) > 0:
-            distances_df = distances_df.sort_values('distance_km').head(n)
+        distances_df = self.df.iloc[positions][[
+            'name', 'cuisine_type', 'rating', 'review_count', 'price_range', 'address',
+            'latitude', 'longitude'
+        ]].reset_index(drop=True)
+        distances_df.insert(6, 'distance_km', np.round(distances, 2))
         
         return distances_df
     
@@ -606,24 +635,12 @@ class RestaurantRecommender:
                 cuisine, case=False, na=False)]
         
         if max_distance_km and center_lat and center_lon:
-            distances = []
-            for idx, restaurant in filtered.iterrows():
-                distance = self.haversine_distance(
-                    center_lat, center_lon,
-                    restaurant['latitude'],
-                    restaurant['longitude']
-                )
-                if distance <= max_distance_km:
-                    distances.append({
-                        'index': idx,
-                        'distance_km': round(distance, 2)
-                    })
+            positions, distances = self.query_radius(center_lat, center_lon, max_distance_km)
+            keep = self.df.index[positions].isin(filtered.index)
             
-            if distances:
-                dist_df = pd.DataFrame(distances).set_index('index')
-                filtered = filtered.loc[dist_df.index].copy()
-                filtered['distance_km'] = dist_df['distance_km'].values
-                filtered = filtered.sort_values('distance_km')
+            if keep.any():
+                filtered = self.df.iloc[positions[keep]].copy()
+                filtered['distance_km'] = np.round(distances[keep], 2)
         else:
             filtered = filtered.sort_values('rating', ascending=False)
         
@@ -704,7 +721,8 @@ class RestaurantRecommender:
             'user_similarity_matrix': self.user_similarity_matrix,
             'item_similarity_matrix': getattr(self, 'item_similarity_matrix', None),
             'svd_model': self.svd_model,
-            'location_matrix': self.location_matrix
+            'location_matrix': self.location_matrix,
+            'spatial_index': self.spatial_index
         }
         
         with open(filepath, 'wb') as f:
@@ -732,6 +750,9 @@ class RestaurantRecommender:
         recommender.item_similarity_matrix = model_data.get('item_similarity_matrix')
         recommender.svd_model = model_data.get('svd_model')
         recommender.location_matrix = model_data.get('location_matrix')
+        recommender.spatial_index = model_data.get('spatial_index')
+        if recommender.spatial_index is None:
+            recommender.build_spatial_index()
         
         print(f"✓ Model loaded successfully from: {filepath}")
         print(f"  Restaurants: {len(recommender.df)}")
@@ -2,26 +2,42 @@ import pandas as pd
 import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.preprocessing import MinMaxScaler
-from scipy.sparse import csr_matrix
+from sklearn.preprocessing import MinMaxScaler, normalize
+from sklearn.neighbors import BallTree
+from scipy.sparse import csr_matrix, issparse
 from scipy.sparse.linalg import svds
 import pickle
+import json
 import os
+import shutil
 import warnings
 from math import radians, sin, cos, sqrt, atan2
 import requests
 warnings.filterwarnings('ignore')
 
 class RestaurantRecommender:
+    # Comma-separated categorical columns that user filters match against
+    FILTER_COLUMNS = ['cuisine_type', 'atmosphere', 'amenities', 'restaurant_type']
+    
+    # Bump when the on-disk artifact layout written by save_artifact changes
+    ARTIFACT_SCHEMA_VERSION = 1
+    
     def __init__(self, restaurants_file=None, reviews_file=None):
         """Initialize the recommender system with two data files (Excel or CSV)"""
         self.similarity_matrix = None
         self.review_sentiment_scores = None
         self.location_matrix = None
         self.user_item_matrix = None
+        self.cf_users = None
+        self.cf_items = None
         self.svd_model = None
         self.user_similarity_matrix = None
         self.item_similarity_matrix = None
+        self.content_scores = None
+        self.location_scores = None
+        self.filter_index = None
+        self.spatial_index = None
+        self.build_params = {}
         
         # Only load data if files are provided (for new model training)
         if restaurants_file and reviews_file:
@@ -117,23 +133,48 @@ class RestaurantRecommender:
         
         return f"No restaurants found within {radius_km}km of {user_address} matching your criteria."
     
-    def calculate_distance_matrix(self):
-        """Calculate distance matrix between all restaurants"""
-        n = len(self.df)
-        distance_matrix = np.zeros((n, n))
-        
-        for i in range(n):
-            for j in range(n):
-                if i != j:
-                    distance_matrix[i, j] = self.haversine_distance(
-                        self.df.iloc[i]['latitude'],
-                        self.df.iloc[i]['longitude'],
-                        self.df.iloc[j]['latitude'],
-                        self.df.iloc[j]['longitude']
-                    )
+    def haversine_vectorized(self, lat1, lon1, lat2, lon2):
+        """Vectorized Haversine distance (in km); array inputs broadcast against each other"""
+        R = 6371  # Earth's radius in kilometers
+        lat1, lon1, lat2, lon2 = map(np.radians, [lat1, lon1, lat2, lon2])
+        dlat = lat2 - lat1
+        dlon = lon2 - lon1
+        a = np.sin(dlat/2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon/2)**2
+        a = np.clip(a, 0, 1)
+        c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1-a))
+        return R * c
+    
+    def location_similarity(self, start=0, stop=None, dtype=np.float64):
+        """exp(-d/5) location similarity of rows start:stop against every restaurant"""
+        latitudes = self.df['latitude'].to_numpy(dtype=float)
+        longitudes = self.df['longitude'].to_numpy(dtype=float)
+        stop = len(latitudes) if stop is None else stop
+        
+        distances = self.haversine_vectorized(
+            latitudes[start:stop, None],
+            longitudes[start:stop, None],
+            latitudes[None, :],
+            longitudes[None, :]
+        )
         
         scale = 5.0
-        location_sim = np.exp(-distance_matrix / scale)
+        location_sim = np.exp(-distances / scale).astype(dtype, copy=False)
+        location_sim[np.arange(stop - start), np.arange(start, stop)] = 1.0
+        return location_sim
+    
+    def calculate_distance_matrix(self, dtype=np.float64, block_size=2048):
+        """Calculate location similarity between all restaurants
+        
+        Distances are computed with NumPy broadcasting, `block_size` rows at a time
+        to cap peak memory. Pass dtype=np.float32 to halve the size of the stored result.
+        """
+        n = len(self.df)
+        location_sim = np.empty((n, n), dtype=dtype)
+        
+        for block_start in range(0, n, block_size):
+            block_end = min(block_start + block_size, n)
+            location_sim[block_start:block_end] = self.location_similarity(block_start, block_end, dtype)
+        
         return location_sim
         
     def preprocess_data(self):
@@ -175,6 +216,8 @@ class RestaurantRecommender:
         )
         
         self._process_reviews()
+        self.build_filter_index()
+        self.build_spatial_index()
         
         print(f"\n✓ Data validation:")
         print(f"  - Restaurants with valid coordinates: {self.df[['latitude', 'longitude']].notna().all(axis=1).sum()}")
@@ -184,6 +227,100 @@ class RestaurantRecommender:
         print("\nData preprocessing complete!")
         return self
     
+    def build_filter_index(self):
+        """Tokenize categorical columns into one boolean mask per distinct value
+        
+        Filters then become OR/AND combinations of precomputed masks instead of a
+        per-request string scan over every row. Ratings are kept as a sorted order
+        so `min_rating` is a single binary search.
+        """
+        n_rows = len(self.df)
+        
+        tokens = {}
+        for col in self.FILTER_COLUMNS:
+            masks = {}
+            values = self.df[col].fillna('').astype(str).str.lower().str.split(',')
+            for pos, row_tokens in enumerate(values):
+                for token in row_tokens:
+                    token = token.strip()
+                    if token:
+                        masks.setdefault(token, np.zeros(n_rows, dtype=bool))[pos] = True
+            tokens[col] = masks
+        
+        price_levels = self.df['price_level'].to_numpy()
+        price_masks = {int(level): price_levels == level for level in np.unique(price_levels)}
+        
+        ratings = self.df['rating'].to_numpy(dtype=float)
+        rated = np.flatnonzero(~np.isnan(ratings))
+        rating_order = rated[np.argsort(ratings[rated], kind='stable')]
+        
+        self.filter_index = {
+            'tokens': tokens,
+            'price_level': price_masks,
+            'rating_order': rating_order,
+            'rating_sorted': ratings[rating_order]
+        }
+        
+        print(f"\n✓ Built filter index")
+        for col, masks in tokens.items():
+            print(f"  - {col}: {len(masks)} values")
+        return self
+    
+    def build_spatial_index(self):
+        """Build a haversine BallTree over restaurant coordinates
+        
+        Radius and nearest-neighbour queries then only visit nearby candidates
+        instead of computing a distance to every restaurant.
+        """
+        coords = self.df[['latitude', 'longitude']].to_numpy(dtype=float)
+        positions = np.flatnonzero(~np.isnan(coords).any(axis=1))
+        
+        self.spatial_index = {
+            'tree': BallTree(np.radians(coords[positions]), metric='haversine'),
+            'positions': positions
+        }
+        
+        print(f"\n✓ Built spatial index over {len(positions)} restaurants")
+        return self
+    
+    def query_radius(self, latitude, longitude, radius_km):
+        """Return positions and distances (km) of restaurants within radius, nearest first"""
+        R = 6371  # Earth's radius in kilometers
+        point = np.radians([[latitude, longitude]])
+        
+        ind, dist = self.spatial_index['tree'].query_radius(
+            point, r=radius_km / R, return_distance=True, sort_results=True
+        )
+        return self.spatial_index['positions'][ind[0]], dist[0] * R
+    
+    def filter_mask(self, min_rating=None, cuisine_filter=None, budget_filter=None,
+                    atmosphere_filter=None, amenities_filter=None, restaurant_type_filter=None):
+        """Boolean mask of restaurants passing ALL filters, served from the filter index"""
+        n_rows = len(self.df)
+        mask = np.ones(n_rows, dtype=bool)
+        
+        if min_rating:
+            mask &= self.df['rating'].to_numpy() >= min_rating
+        if budget_filter:
+            if isinstance(budget_filter, int):
+                mask &= self.filter_index['price_level'].get(budget_filter, np.zeros(n_rows, dtype=bool))
+            else:
+                mask &= self.df['price_range'].astype(str).str.lower().str.contains(
+                    budget_filter.lower(), regex=False).to_numpy()
+        
+        for column, value in [('cuisine_type', cuisine_filter),
+                              ('atmosphere', atmosphere_filter),
+                              ('amenities', amenities_filter),
+                              ('restaurant_type', restaurant_type_filter)]:
+            if value:
+                value_mask = np.zeros(n_rows, dtype=bool)
+                for token, token_mask in self.filter_index['tokens'][column].items():
+                    if value.lower() in token:
+                        value_mask |= token_mask
+                mask &= value_mask
+        
+        return mask
+    
     def _extract_price_level(self, price_range):
         """Extract numeric price level from price_range string
         Budget levels:
@@ -238,8 +375,14 @@ class RestaurantRecommender:
         
         print(f"\n✓ Processed {len(review_agg)} restaurants with reviews")
     
-    def build_model(self, weights=None, use_reviews=True, use_location=True):
-        """Build content-based recommendation model"""
+    def build_model(self, weights=None, use_reviews=True, use_location=True,
+                    top_k=None, block_size=512):
+        """Build content-based recommendation model
+        
+        With top_k set, only the top_k neighbours of each restaurant are kept in a
+        CSR matrix (float32 scores, int32 indices). Similarities are then computed
+        block_size rows at a time and the dense N x N matrices are never materialized.
+        """
         print("\n" + "="*70)
         print("BUILDING CONTENT-BASED MODEL")
         print("="*70)
@@ -255,29 +398,51 @@ class RestaurantRecommender:
         
         print(f"\nModel weights: {weights}")
         
-        n_restaurants = len(self.df)
+        self.build_params['model'] = {
+            'weights': weights,
+            'use_reviews': use_reviews,
+            'use_location': use_location,
+            'top_k': top_k
+        }
+        
+        features = self._similarity_features(use_reviews, use_location)
         
-        print("\n1. Building content-based similarity...")
+        if top_k:
+            print(f"\n6. Keeping top-{top_k} neighbours per restaurant...")
+            self._build_topk_similarity(features, weights, top_k, block_size)
+            print(f"   ✓ Sparse similarity matrix: {self.similarity_matrix.shape}, "
+                  f"{self.similarity_matrix.nnz} stored neighbours")
+        else:
+            print("\n6. Combining all similarity matrices...")
+            self.similarity_matrix, self.location_matrix = self._similarity_block(features, weights)
+            print(f"   ✓ Final similarity matrix: {self.similarity_matrix.shape}")
+            print(f"   ✓ Similarity range: [{self.similarity_matrix.min():.3f}, {self.similarity_matrix.max():.3f}]")
+            
+            print("\n7. Precomputing per-restaurant score vectors...")
+            self._build_score_vectors()
+            print(f"   ✓ Content and location score vectors: {self.content_scores.shape}")
+        
+        print(f"\n✓ Content-based model built successfully with {len(self.df)} restaurants!")
+        return self
+    
+    def _similarity_features(self, use_reviews, use_location):
+        """Fit the per-component features that pairwise similarities are computed from"""
+        print("\n1. Building content features...")
         tfidf_content = TfidfVectorizer(stop_words='english', ngram_range=(1, 2), max_features=500)
         content_matrix = tfidf_content.fit_transform(self.df['combined_features'])
-        content_sim = cosine_similarity(content_matrix, content_matrix)
-        print(f"   ✓ Content similarity matrix: {content_sim.shape}")
+        print(f"   ✓ Content TF-IDF matrix: {content_matrix.shape}")
         
-        print("2. Building rating similarity...")
+        print("2. Building rating features...")
         ratings = self.df['rating'].values.reshape(-1, 1)
         scaler = MinMaxScaler()
         ratings_scaled = scaler.fit_transform(ratings)
-        rating_sim = 1 - np.abs(ratings_scaled - ratings_scaled.T)
-        print(f"   ✓ Rating similarity matrix: {rating_sim.shape}")
         
-        print("3. Building price similarity...")
+        print("3. Building price features...")
         price_levels = self.df['price_level'].fillna(2).values.reshape(-1, 1)
         price_scaled = price_levels / 3.0  # Changed from 4.0 to 3.0 for 3 levels
-        price_sim = 1 - np.abs(price_scaled - price_scaled.T)
-        print(f"   ✓ Price similarity matrix: {price_sim.shape}")
         
-        print("4. Building review text similarity...")
-        review_sim = np.zeros((n_restaurants, n_restaurants))
+        print("4. Building review text features...")
+        review_matrix = None
         if use_reviews and 'all_reviews_text' in self.df.columns:
             has_reviews = self.df['all_reviews_text'].str.len() > 0
             if has_reviews.sum() > 0:
@@ -285,82 +450,133 @@ class RestaurantRecommender:
                 tfidf_reviews = TfidfVectorizer(stop_words='english', max_features=100, min_df=1)
                 try:
                     review_matrix = tfidf_reviews.fit_transform(review_texts)
-                    review_sim = cosine_similarity(review_matrix, review_matrix)
-                    print(f"   ✓ Review similarity matrix: {review_sim.shape}")
+                    print(f"   ✓ Review TF-IDF matrix: {review_matrix.shape}")
                 except:
                     print("   ⚠ Warning: Could not process review texts for similarity")
         else:
             print("   ⚠ Skipping review similarity (disabled or no reviews)")
         
-        print("5. Building location similarity...")
-        location_sim = np.zeros((n_restaurants, n_restaurants))
-        if use_location and 'latitude' in self.df.columns and 'longitude' in self.df.columns:
-            location_sim = self.calculate_distance_matrix()
-            self.location_matrix = location_sim
-            print(f"   ✓ Location similarity matrix: {location_sim.shape}")
+        print("5. Building location features...")
+        use_location = use_location and 'latitude' in self.df.columns and 'longitude' in self.df.columns
+        if use_location:
+            print(f"   ✓ Using coordinates of {len(self.df)} restaurants")
         else:
             print("   ⚠ Skipping location similarity (disabled or no coordinates)")
         
-        print("\n6. Combining all similarity matrices...")
-        self.similarity_matrix = (
-            weights['content'] * content_sim +
-            weights['rating'] * rating_sim +
-            weights['price'] * price_sim +
-            weights['reviews'] * review_sim +
-            weights['location'] * location_sim
-        )
+        return {
+            'content': content_matrix,
+            'rating': ratings_scaled,
+            'price': price_scaled,
+            'reviews': review_matrix,
+            'location': use_location
+        }
+    
+    def _similarity_block(self, features, weights, start=0, stop=None):
+        """Weighted similarity of rows start:stop against every restaurant
         
-        print(f"   ✓ Final similarity matrix: {self.similarity_matrix.shape}")
-        print(f"   ✓ Similarity range: [{self.similarity_matrix.min():.3f}, {self.similarity_matrix.max():.3f}]")
+        Returns the combined block and its location component (None when location
+        similarity is disabled).
+        """
+        stop = len(self.df) if stop is None else stop
+        rows = slice(start, stop)
         
-        print(f"\n✓ Content-based model built successfully with {len(self.df)} restaurants!")
-        return self
+        block = weights['content'] * cosine_similarity(features['content'][rows], features['content'])
+        block += weights['rating'] * (1 - np.abs(features['rating'][rows] - features['rating'].T))
+        block += weights['price'] * (1 - np.abs(features['price'][rows] - features['price'].T))
+        
+        if features['reviews'] is not None:
+            block += weights['reviews'] * cosine_similarity(features['reviews'][rows], features['reviews'])
+        
+        location_block = None
+        if features['location']:
+            location_block = self.location_similarity(start, stop)
+            block += weights['location'] * location_block
+        
+        return block, location_block
+    
+    def _build_topk_similarity(self, features, weights, top_k, block_size):
+        """Keep only the top_k neighbours of every restaurant in a CSR matrix
+        
+        Score vectors are taken from the full rows while each block is in memory,
+        so ranking is unaffected by the truncation.
+        """
+        n = len(self.df)
+        top_k = min(top_k, n - 1)
+        
+        indices = np.empty((n, top_k), dtype=np.int32)
+        scores = np.empty((n, top_k), dtype=np.float32)
+        self.content_scores = np.empty(n)
+        self.location_scores = np.zeros(n)
+        
+        for block_start in range(0, n, block_size):
+            block_end = min(block_start + block_size, n)
+            block, location_block = self._similarity_block(features, weights, block_start, block_end)
+            
+            self.content_scores[block_start:block_end] = block.mean(axis=1)
+            if location_block is not None:
+                self.location_scores[block_start:block_end] = location_block.mean(axis=1)
+            
+            # A restaurant is not its own neighbour
+            block[np.arange(block_end - block_start), np.arange(block_start, block_end)] = -np.inf
+            
+            top = np.argpartition(-block, top_k - 1, axis=1)[:, :top_k]
+            indices[block_start:block_end] = top
+            scores[block_start:block_end] = np.take_along_axis(block, top, axis=1)
+        
+        indptr = np.arange(0, n * top_k + 1, top_k, dtype=np.int32)
+        self.similarity_matrix = csr_matrix((scores.ravel(), indices.ravel(), indptr), shape=(n, n))
+        self.location_matrix = None
     
-    def build_collaborative_filtering(self, method='user-based', n_factors=20):
+    def _build_score_vectors(self):
+        """Precompute the mean content and location similarity of every restaurant
+        
+        These row means are what inference ranks by and they do not change between
+        requests, so they are stored with the model instead of recomputed per call.
+        """
+        self.content_scores = np.asarray(self.similarity_matrix.mean(axis=1)).ravel()
+        if self.location_matrix is not None:
+            self.location_scores = np.asarray(self.location_matrix.mean(axis=1)).ravel()
+        else:
+            self.location_scores = np.zeros(len(self.df))
+    
+    def build_collaborative_filtering(self, method='user-based', n_factors=20, n_neighbors=10):
         """Build collaborative filtering model"""
         print("\n" + "="*70)
         print(f"BUILDING COLLABORATIVE FILTERING MODEL ({method.upper()})")
         print("="*70)
         
-        user_item_df = self.reviews.pivot_table(
-            index='username',
-            columns='place_id',
-            values='rating',
-            fill_value=0
-        )
+        self.build_params['collaborative_filtering'] = {
+            'method': method, 'n_factors': n_factors, 'n_neighbors': n_neighbors
+        }
         
-        self.user_item_matrix = user_item_df
-        print(f"\nUser-Item Matrix: {user_item_df.shape[0]} users × {user_item_df.shape[1]} items")
-        print(f"  - Sparsity: {(user_item_df == 0).sum().sum() / (user_item_df.shape[0] * user_item_df.shape[1]) * 100:.2f}%")
-        print(f"  - Total ratings: {(user_item_df != 0).sum().sum()}")
+        self._build_user_item_matrix()
+        n_users, n_items = self.user_item_matrix.shape
+        n_ratings = self.user_item_matrix.nnz
+        print(f"\nUser-Item Matrix: {n_users} users × {n_items} items")
+        print(f"  - Sparsity: {(1 - n_ratings / (n_users * n_items)) * 100:.2f}%")
+        print(f"  - Total ratings: {n_ratings}")
         
         if method == 'user-based':
-            print("\nBuilding user-based similarity matrix...")
-            user_similarity = cosine_similarity(user_item_df.values)
-            self.user_similarity_matrix = pd.DataFrame(
-                user_similarity,
-                index=user_item_df.index,
-                columns=user_item_df.index
-            )
-            print(f"✓ User-based similarity matrix created: {self.user_similarity_matrix.shape}")
+            print("\nBuilding user-based neighbour lists...")
+            self.user_similarity_matrix = self._build_user_neighbours(n_neighbors)
+            print(f"✓ User-based neighbours created: top {n_neighbors} for {n_users} users "
+                  f"({self.user_similarity_matrix.nnz} pairs)")
             
         elif method == 'item-based':
             print("\nBuilding item-based similarity matrix...")
-            item_similarity = cosine_similarity(user_item_df.T.values)
+            item_similarity = cosine_similarity(self.user_item_matrix.T)
             self.item_similarity_matrix = pd.DataFrame(
                 item_similarity,
-                index=user_item_df.columns,
-                columns=user_item_df.columns
+                index=self.cf_items,
+                columns=self.cf_items
             )
             print(f"✓ Item-based similarity matrix created: {self.item_similarity_matrix.shape}")
             
         elif method == 'matrix-factorization':
             print("\nBuilding matrix factorization model...")
-            user_item_matrix = user_item_df.values
-            if user_item_matrix.shape[0] > n_factors and user_item_matrix.shape[1] > n_factors:
-                sparse_matrix = csr_matrix(user_item_matrix)
-                k = min(n_factors, min(user_item_matrix.shape) - 1)
-                U, sigma, Vt = svds(sparse_matrix, k=k)
+            if n_users > n_factors and n_items > n_factors:
+                k = min(n_factors, min(n_users, n_items) - 1)
+                U, sigma, Vt = svds(self.user_item_matrix, k=k)
                 sigma = np.diag(sigma)
                 predicted_ratings = np.dot(np.dot(U, sigma), Vt)
                 
@@ -369,17 +585,77 @@ class RestaurantRecommender:
                     'sigma': sigma,
                     'Vt': Vt,
                     'predicted_ratings': predicted_ratings,
-                    'users': user_item_df.index,
-                    'items': user_item_df.columns
+                    'users': self.cf_users,
+                    'items': self.cf_items
                 }
                 print(f"✓ Matrix factorization model created with {k} factors")
             else:
-                print(f"⚠ Not enough data for matrix factorization ({user_item_matrix.shape}). Using user-based instead.")
-                return self.build_collaborative_filtering('user-based')
+                print(f"⚠ Not enough data for matrix factorization ({self.user_item_matrix.shape}). Using user-based instead.")
+                return self.build_collaborative_filtering('user-based', n_neighbors=n_neighbors)
         
         print(f"\n✓ Collaborative filtering model built successfully!")
         return self
     
+    def _build_user_item_matrix(self):
+        """CSR users × restaurants matrix of review ratings; unrated cells are not stored
+        
+        Row and column labels are kept in cf_users / cf_items (both sorted, as
+        pivot_table would order them). Repeat reviews of a place are averaged.
+        """
+        ratings = self.reviews.groupby(['username', 'place_id'])['rating'].mean().dropna()
+        user_codes, self.cf_users = pd.factorize(ratings.index.get_level_values('username'), sort=True)
+        item_codes, self.cf_items = pd.factorize(ratings.index.get_level_values('place_id'), sort=True)
+        
+        self.user_item_matrix = csr_matrix(
+            (ratings.to_numpy(dtype=float), (user_codes, item_codes)),
+            shape=(len(self.cf_users), len(self.cf_items))
+        )
+        self.user_item_matrix.eliminate_zeros()
+        return self.user_item_matrix
+    
+    def _build_user_neighbours(self, n_neighbors=10, block_size=1024):
+        """Top-K most similar users for every user, as a sparse users × users matrix
+        
+        Cosine similarities come from sparse products of L2-normalised rating rows,
+        one block of users at a time, so only pairs of users who rated a common
+        restaurant are ever materialised. A user is never its own neighbour.
+        """
+        normalized = normalize(self.user_item_matrix)
+        n_users = normalized.shape[0]
+        rows, cols, values = [], [], []
+        
+        for start in range(0, n_users, block_size):
+            block = (normalized[start:start + block_size] @ normalized.T).tocoo()
+            block_rows = block.row + start
+            keep = (block_rows != block.col) & (block.data > 0)
+            block_rows, block_cols, block_data = block_rows[keep], block.col[keep], block.data[keep]
+            
+            # Rank each user's candidates by similarity (ties by user order), keep the first K
+            order = np.lexsort((block_cols, -block_data, block_rows))
+            block_rows, block_cols, block_data = block_rows[order], block_cols[order], block_data[order]
+            rank = np.arange(len(block_rows)) - np.searchsorted(block_rows, block_rows, side='left')
+            keep = rank < n_neighbors
+            
+            rows.append(block_rows[keep])
+            cols.append(block_cols[keep])
+            values.append(block_data[keep])
+        
+        return csr_matrix(
+            (np.concatenate(values).astype(np.float32), (np.concatenate(rows), np.concatenate(cols))),
+            shape=(n_users, n_users)
+        )
+    
+    def _convert_dense_collaborative_filtering(self):
+        """Convert user-item / user-similarity DataFrames from older models to the sparse layout"""
+        if isinstance(self.user_item_matrix, pd.DataFrame):
+            self.cf_users = self.user_item_matrix.index
+            self.cf_items = self.user_item_matrix.columns
+            self.user_item_matrix = csr_matrix(self.user_item_matrix.to_numpy())
+        
+        if isinstance(self.user_similarity_matrix, pd.DataFrame):
+            n_neighbors = self.build_params.get('collaborative_filtering', {}).get('n_neighbors', 10)
+            self.user_similarity_matrix = self._build_user_neighbours(n_neighbors)
+    
     def save_model(self, filepath='restaurant_recommender.pkl'):
         """Save the trained model to a pickle file"""
         print("\n" + "="*70)
@@ -391,11 +667,18 @@ class RestaurantRecommender:
             'reviews': self.reviews,
             'similarity_matrix': self.similarity_matrix,
             'location_matrix': self.location_matrix,
+            'content_scores': self.content_scores,
+            'location_scores': self.location_scores,
+            'filter_index': self.filter_index,
+            'spatial_index': self.spatial_index,
             'user_item_matrix': self.user_item_matrix,
+            'cf_users': self.cf_users,
+            'cf_items': self.cf_items,
             'user_similarity_matrix': self.user_similarity_matrix,
             'item_similarity_matrix': self.item_similarity_matrix,
             'svd_model': self.svd_model,
-            'review_sentiment_scores': self.review_sentiment_scores
+            'review_sentiment_scores': self.review_sentiment_scores,
+            'build_params': self.build_params
         }
         
         try:
@@ -411,6 +694,7 @@ class RestaurantRecommender:
             print(f"    - Reviews: {len(self.reviews)}")
             print(f"    - Similarity matrix: {'Yes' if self.similarity_matrix is not None else 'No'}")
             print(f"    - Location matrix: {'Yes' if self.location_matrix is not None else 'No'}")
+            print(f"    - Score vectors: {'Yes' if self.content_scores is not None else 'No'}")
             print(f"    - User similarity: {'Yes' if self.user_similarity_matrix is not None else 'No'}")
             print(f"    - Item similarity: {'Yes' if self.item_similarity_matrix is not None else 'No'}")
             print(f"    - SVD model: {'Yes' if self.svd_model is not None else 'No'}")
@@ -422,11 +706,14 @@ class RestaurantRecommender:
     
     @classmethod
     def load_model(cls, filepath='restaurant_recommender.pkl'):
-        """Load a previously saved model from pickle file"""
+        """Load a previously saved model from pickle file (or artifact directory)"""
         try:
             if not os.path.exists(filepath):
                 raise FileNotFoundError(f"Model file not found: {filepath}")
             
+            if os.path.isdir(filepath):
+                return cls.load_artifact(filepath)
+            
             with open(filepath, 'rb') as f:
                 model_data = pickle.load(f)
             
@@ -436,11 +723,26 @@ class RestaurantRecommender:
             recommender.reviews = model_data['reviews']
             recommender.similarity_matrix = model_data['similarity_matrix']
             recommender.location_matrix = model_data['location_matrix']
+            recommender.content_scores = model_data.get('content_scores')
+            recommender.location_scores = model_data.get('location_scores')
+            recommender.filter_index = model_data.get('filter_index')
+            recommender.spatial_index = model_data.get('spatial_index')
             recommender.user_item_matrix = model_data['user_item_matrix']
+            recommender.cf_users = model_data.get('cf_users')
+            recommender.cf_items = model_data.get('cf_items')
             recommender.user_similarity_matrix = model_data['user_similarity_matrix']
             recommender.item_similarity_matrix = model_data['item_similarity_matrix']
             recommender.svd_model = model_data['svd_model']
             recommender.review_sentiment_scores = model_data.get('review_sentiment_scores')
+            recommender.build_params = model_data.get('build_params', {})
+            
+            if recommender.content_scores is None and recommender.similarity_matrix is not None:
+                recommender._build_score_vectors()
+            if recommender.filter_index is None:
+                recommender.build_filter_index()
+            if recommender.spatial_index is None:
+                recommender.build_spatial_index()
+            recommender._convert_dense_collaborative_filtering()
             
             print(f"✓ Model loaded successfully from: {filepath}")
             print(f"  Restaurants: {len(recommender.df)}")
@@ -452,6 +754,179 @@ class RestaurantRecommender:
             print(f"❌ Error loading model: {e}")
             raise
     
+    def save_artifact(self, dirpath='restaurant_recommender'):
+        """Save the model as a versioned directory of memory-mappable arrays
+        
+        Arrays are written as .npy files that load_artifact opens with
+        np.load(mmap_mode='r'), the restaurant and review tables as Parquet, and
+        manifest.json records the schema version and build parameters. Inference
+        workers mapping the same directory share one copy through the page cache.
+        The directory is written next to the target and swapped in at the end.
+        """
+        print("\n" + "="*70)
+        print("SAVING MODEL ARTIFACT")
+        print("="*70)
+        
+        dirpath = dirpath.rstrip('/\\')
+        tmp_path = dirpath + '.tmp'
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        
+        manifest = {
+            'schema_version': self.ARTIFACT_SCHEMA_VERSION,
+            'created_at': pd.Timestamp.now().isoformat(),
+            'build_params': self.build_params,
+            'n_restaurants': len(self.df),
+            'arrays': [],
+            'sparse': {},
+            'frames': [],
+            'filter_index': None,
+            'svd_model': None
+        }
+        
+        def save_array(name, array):
+            array = np.asarray(array)
+            if array.dtype == object:
+                array = array.astype(str)
+            np.save(os.path.join(tmp_path, f"{name}.npy"), array)
+            manifest['arrays'].append(name)
+        
+        self.df.to_parquet(os.path.join(tmp_path, 'restaurants.parquet'), index=False)
+        self.reviews.to_parquet(os.path.join(tmp_path, 'reviews.parquet'), index=False)
+        
+        for name in ['content_scores', 'location_scores', 'location_matrix']:
+            if getattr(self, name) is not None:
+                save_array(name, getattr(self, name))
+        
+        for name in ['similarity_matrix', 'user_item_matrix', 'user_similarity_matrix']:
+            matrix = getattr(self, name)
+            if issparse(matrix):
+                matrix = matrix.tocsr()
+                for part in ['data', 'indices', 'indptr']:
+                    save_array(f'{name}.{part}', getattr(matrix, part))
+                manifest['sparse'][name] = list(matrix.shape)
+        if self.similarity_matrix is not None and not issparse(self.similarity_matrix):
+            save_array('similarity_matrix', self.similarity_matrix)
+        
+        if self.filter_index is not None:
+            tokens = {}
+            for col, masks in self.filter_index['tokens'].items():
+                tokens[col] = list(masks)
+                save_array(f'filter.{col}', np.array(list(masks.values()), dtype=bool).reshape(len(masks), len(self.df)))
+            price_levels = sorted(self.filter_index['price_level'])
+            save_array('filter.price_level', [self.filter_index['price_level'][level] for level in price_levels])
+            save_array('filter.rating_order', self.filter_index['rating_order'])
+            save_array('filter.rating_sorted', self.filter_index['rating_sorted'])
+            manifest['filter_index'] = {'tokens': tokens, 'price_levels': price_levels}
+        
+        for name in ['cf_users', 'cf_items']:
+            if getattr(self, name) is not None:
+                save_array(name, getattr(self, name))
+        
+        for name in ['user_item_matrix', 'user_similarity_matrix', 'item_similarity_matrix']:
+            frame = getattr(self, name)
+            if isinstance(frame, pd.DataFrame):
+                save_array(name, frame.to_numpy())
+                save_array(f'{name}.index', frame.index)
+                save_array(f'{name}.columns', frame.columns)
+                manifest['frames'].append(name)
+        
+        if self.svd_model is not None:
+            for key, value in self.svd_model.items():
+                save_array(f'svd_model.{key}', value)
+            manifest['svd_model'] = list(self.svd_model)
+        
+        with open(os.path.join(tmp_path, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, default=str)
+        
+        if os.path.exists(dirpath):
+            old_path = dirpath + '.old'
+            shutil.rmtree(old_path, ignore_errors=True)
+            os.rename(dirpath, old_path)
+            os.rename(tmp_path, dirpath)
+            shutil.rmtree(old_path)
+        else:
+            os.rename(tmp_path, dirpath)
+        
+        size_mb = sum(entry.stat().st_size for entry in os.scandir(dirpath)) / (1024 * 1024)
+        print(f"\n✓ Model artifact saved to: {dirpath}")
+        print(f"  Schema version: {self.ARTIFACT_SCHEMA_VERSION}")
+        print(f"  Total size: {size_mb:.2f} MB ({len(manifest['arrays'])} arrays)")
+        return True
+    
+    @classmethod
+    def load_artifact(cls, dirpath='restaurant_recommender', mmap_mode='r'):
+        """Load a model directory written by save_artifact
+        
+        Arrays are memory-mapped read-only by default; the spatial index is rebuilt
+        from the restaurant coordinates.
+        """
+        with open(os.path.join(dirpath, 'manifest.json'), encoding='utf-8') as f:
+            manifest = json.load(f)
+        
+        if manifest['schema_version'] > cls.ARTIFACT_SCHEMA_VERSION:
+            raise ValueError(f"Unsupported model schema version: {manifest['schema_version']} "
+                             f"(this code reads up to {cls.ARTIFACT_SCHEMA_VERSION})")
+        
+        arrays = set(manifest['arrays'])
+        
+        def load_array(name):
+            return np.load(os.path.join(dirpath, f"{name}.npy"), mmap_mode=mmap_mode)
+        
+        recommender = cls()
+        recommender.build_params = manifest.get('build_params', {})
+        recommender.df = pd.read_parquet(os.path.join(dirpath, 'restaurants.parquet'))
+        recommender.reviews = pd.read_parquet(os.path.join(dirpath, 'reviews.parquet'))
+        
+        for name in ['content_scores', 'location_scores', 'location_matrix']:
+            setattr(recommender, name, load_array(name) if name in arrays else None)
+        
+        for name, shape in manifest['sparse'].items():
+            setattr(recommender, name, csr_matrix(
+                (load_array(f'{name}.data'), load_array(f'{name}.indices'), load_array(f'{name}.indptr')),
+                shape=tuple(shape)
+            ))
+        if 'similarity_matrix' in arrays:
+            recommender.similarity_matrix = load_array('similarity_matrix')
+        
+        for name in ['cf_users', 'cf_items']:
+            if name in arrays:
+                setattr(recommender, name, pd.Index(load_array(name)))
+        
+        if manifest['filter_index'] is not None:
+            price_masks = load_array('filter.price_level')
+            recommender.filter_index = {
+                'tokens': {
+                    col: dict(zip(values, load_array(f'filter.{col}')))
+                    for col, values in manifest['filter_index']['tokens'].items()
+                },
+                'price_level': dict(zip(manifest['filter_index']['price_levels'], price_masks)),
+                'rating_order': load_array('filter.rating_order'),
+                'rating_sorted': load_array('filter.rating_sorted')
+            }
+        else:
+            recommender.build_filter_index()
+        
+        for name in manifest['frames']:
+            setattr(recommender, name, pd.DataFrame(
+                load_array(name),
+                index=load_array(f'{name}.index'),
+                columns=load_array(f'{name}.columns'),
+                copy=False
+            ))
+        
+        if manifest['svd_model'] is not None:
+            recommender.svd_model = {key: load_array(f'svd_model.{key}') for key in manifest['svd_model']}
+        
+        recommender.build_spatial_index()
+        recommender._convert_dense_collaborative_filtering()
+        
+        print(f"✓ Model artifact loaded from: {dirpath} (schema v{manifest['schema_version']})")
+        print(f"  Restaurants: {len(recommender.df)}")
+        print(f"  Reviews: {len(recommender.reviews)}")
+        
+        return recommender
+    
     def get_recommendations(self, restaurant_name, n=5, min_rating=None, 
                           price_level=None, cuisine_filter=None, max_distance_km=None,
                           atmosphere_filter=None, amenities_filter=None, 
@@ -468,125 +943,99 @@ class RestaurantRecommender:
                 return f"Restaurant '{restaurant_name}' not found in dataset."
         
         idx = idx[0]
-        source_restaurant = self.df.iloc[idx]
+        n_rows = len(self.df)
+        
+        if issparse(self.similarity_matrix):
+            # Top-k model: only the stored neighbours are candidates
+            neighbours = self.similarity_matrix[idx]
+            scores = np.full(n_rows, -np.inf)
+            scores[neighbours.indices] = neighbours.data
+            mask = np.zeros(n_rows, dtype=bool)
+            mask[neighbours.indices] = True
+        else:
+            scores = np.asarray(self.similarity_matrix[idx], dtype=float)
+            mask = np.ones(n_rows, dtype=bool)
+        mask[idx] = False
         
-        sim_scores = list(enumerate(self.similarity_matrix[idx]))
-        sim_scores = sorted(sim_scores, key=lambda x: x[1], reverse=True)
+        latitudes = self.df['latitude'].to_numpy(dtype=float)
+        longitudes = self.df['longitude'].to_numpy(dtype=float)
+        distances = self.haversine_vectorized(latitudes[idx], longitudes[idx], latitudes, longitudes)
         
-        recommendations = []
-        for i, score in sim_scores[1:]:
-            restaurant = self.df.iloc[i]
-            
-            distance = self.haversine_distance(
-                source_restaurant['latitude'],
-                source_restaurant['longitude'],
-                restaurant['latitude'],
-                restaurant['longitude']
-            )
-            
-            if min_rating and restaurant['rating'] < min_rating:
-                continue
-            if price_level and restaurant['price_level'] != price_level:
-                continue
-            if budget_filter:
-                if isinstance(budget_filter, int):
-                    if restaurant['price_level'] != budget_filter:
-                        continue
-                else:
-                    if budget_filter.lower() not in str(restaurant['price_range']).lower():
-                        continue
-            if cuisine_filter and cuisine_filter.lower() not in str(restaurant['cuisine_type']).lower():
-                continue
-            if max_distance_km and distance > max_distance_km:
-                continue
-            if atmosphere_filter and atmosphere_filter.lower() not in str(restaurant['atmosphere']).lower():
-                continue
-            if amenities_filter and amenities_filter.lower() not in str(restaurant['amenities']).lower():
-                continue
-            if restaurant_type_filter and restaurant_type_filter.lower() not in str(restaurant['restaurant_type']).lower():
-                continue
-                
-            recommendations.append({
-                'place_id': restaurant['place_id'],
-                'name': restaurant['name'],
-                'cuisine': restaurant['cuisine_type'],
-                'restaurant_type': restaurant.get('restaurant_type', 'Restaurant'),
-                'rating': restaurant['rating'],
-                'review_count': restaurant['review_count'],
-                'price_range': restaurant['price_range'],
-                'price_level': restaurant.get('price_level', None),
-                'atmosphere': restaurant['atmosphere'],
-                'amenities': restaurant.get('amenities', ''),
-                'address': restaurant['address'],
-                'website': restaurant.get('website', ''),
-                'url': restaurant.get('url', ''),
-                'distance_km': round(distance, 2),
-                'latitude': restaurant['latitude'],
-                'longitude': restaurant['longitude'],
-                'similarity_score': round(score, 3)
-            })
-            
-            if len(recommendations) >= n:
-                break
+        mask &= self.filter_mask(
+            min_rating=min_rating,
+            cuisine_filter=cuisine_filter,
+            budget_filter=budget_filter,
+            atmosphere_filter=atmosphere_filter,
+            amenities_filter=amenities_filter,
+            restaurant_type_filter=restaurant_type_filter
+        )
+        if price_level:
+            mask &= self.filter_index['price_level'].get(price_level, np.zeros(n_rows, dtype=bool))
+        if max_distance_km:
+            mask &= ~(distances > max_distance_km)
         
-        if len(recommendations) == 0:
+        positions = np.flatnonzero(mask)
+        if len(positions) == 0:
             return "No restaurants match your filters."
         
-        return pd.DataFrame(recommendations)
+        # Top-n by similarity without sorting every candidate; ties keep dataset order
+        candidate_scores = scores[positions]
+        if len(positions) > n:
+            top = np.sort(np.argpartition(-candidate_scores, n - 1)[:n])
+        else:
+            top = np.arange(len(positions))
+        top = top[np.argsort(-candidate_scores[top], kind='stable')]
+        positions = positions[top]
+        
+        rows = self.df.iloc[positions]
+        
+        def column(name, default):
+            return rows[name].to_numpy() if name in rows.columns else default
+        
+        return pd.DataFrame({
+            'place_id': rows['place_id'].to_numpy(),
+            'name': rows['name'].to_numpy(),
+            'cuisine': rows['cuisine_type'].to_numpy(),
+            'restaurant_type': column('restaurant_type', 'Restaurant'),
+            'rating': rows['rating'].to_numpy(),
+            'review_count': rows['review_count'].to_numpy(),
+            'price_range': rows['price_range'].to_numpy(),
+            'price_level': column('price_level', None),
+            'atmosphere': rows['atmosphere'].to_numpy(),
+            'amenities': column('amenities', ''),
+            'address': rows['address'].to_numpy(),
+            'website': column('website', ''),
+            'url': column('url', ''),
+            'distance_km': np.round(distances[positions], 2),
+            'latitude': rows['latitude'].to_numpy(),
+            'longitude': rows['longitude'].to_numpy(),
+            'similarity_score': np.round(scores[positions], 3)
+        })
     
     def get_nearby_restaurants(self, latitude, longitude, radius_km=5, n=10, 
                               min_rating=None, cuisine_filter=None, budget_filter=None,
                               atmosphere_filter=None, amenities_filter=None, 
                               restaurant_type_filter=None):
         """Find restaurants near a given location with ALL filters"""
-        distances = []
+        positions, distances = self.query_radius(latitude, longitude, radius_km)
         
-        for idx, restaurant in self.df.iterrows():
-            distance = self.haversine_distance(
-                latitude, longitude,
-                restaurant['latitude'],
-                restaurant['longitude']
-            )
-            
-            if distance <= radius_km:
-                if min_rating and restaurant['rating'] < min_rating:
-                    continue
-                if cuisine_filter and cuisine_filter.lower() not in str(restaurant['cuisine_type']).lower():
-                    continue
-                if budget_filter:
-                    if isinstance(budget_filter, int):
-                        if restaurant['price_level'] != budget_filter:
-                            continue
-                    else:
-                        if budget_filter.lower() not in str(restaurant['price_range']).lower():
-                            continue
-                if atmosphere_filter and atmosphere_filter.lower() not in str(restaurant['atmosphere']).lower():
-                    continue
-                if amenities_filter and amenities_filter.lower() not in str(restaurant['amenities']).lower():
-                    continue
-                if restaurant_type_filter and restaurant_type_filter.lower() not in str(restaurant['restaurant_type']).lower():
-                    continue
-                    
-                distances.append({
-                    'place_id': restaurant['place_id'],
-                    'name': restaurant['name'],
-                    'cuisine_type': restaurant['cuisine_type'],
-                    'restaurant_type': restaurant.get('restaurant_type', 'Restaurant'),
-                    'rating': restaurant['rating'],
-                    'review_count': restaurant['review_count'],
-                    'price_range': restaurant['price_range'],
-                    'price_level': restaurant.get('price_level', 2),
-                    'atmosphere': restaurant['atmosphere'],
-                    'amenities': restaurant.get('amenities', ''),
-                    'address': restaurant['address'],
-                    'distance_km': round(distance, 2),
-                    'latitude': restaurant['latitude'],
-                    'longitude': restaurant['longitude']
-                })
+        keep = self.filter_mask(
+            min_rating=min_rating,
+            cuisine_filter=cuisine_filter,
+            budget_filter=budget_filter,
+            atmosphere_filter=atmosphere_filter,
+            amenities_filter=amenities_filter,
+            restaurant_type_filter=restaurant_type_filter
+        )[positions]
+        positions = positions[keep][:n]
+        distances = distances[keep][:n]
         
-        distances_df = pd.DataFrame(distances)
-        if len(distances_df) > 0:
-            distances_df = distances_df.sort_values('distance_km').head(n)
+        distances_df = self.df.iloc[positions][[
+            'place_id', 'name', 'cuisine_type', 'restaurant_type', 'rating', 'review_count',
+            'price_range', 'price_level', 'atmosphere', 'amenities', 'address',
+            'latitude', 'longitude'
+        ]].reset_index(drop=True)
+        distances_df.insert(11, 'distance_km', np.round(distances, 2))
         
         return distances_df
     
@@ -595,51 +1044,56 @@ class RestaurantRecommender:
         if self.user_similarity_matrix is None:
             return "Collaborative filtering model not built. Call build_collaborative_filtering() first."
         
-        if username not in self.user_similarity_matrix.index:
+        user = self.cf_users.get_indexer([username])[0]
+        if user < 0:
             return f"User '{username}' not found in the system."
         
-        similar_users = self.user_similarity_matrix[username].sort_values(ascending=False)[1:11]
-        user_ratings = self.user_item_matrix.loc[username]
-        restaurants_not_rated = user_ratings[user_ratings == 0].index
-        
-        recommendations = []
-        
-        for place_id in restaurants_not_rated:
-            similar_user_ratings = []
-            for similar_user in similar_users.index:
-                rating = self.user_item_matrix.loc[similar_user, place_id]
-                if rating > 0:
-                    similarity = similar_users[similar_user]
-                    similar_user_ratings.append((rating, similarity))
-            
-            if similar_user_ratings:
-                weighted_sum = sum(rating * sim for rating, sim in similar_user_ratings)
-                similarity_sum = sum(sim for _, sim in similar_user_ratings)
-                predicted_rating = weighted_sum / similarity_sum if similarity_sum > 0 else 0
-                
-                if predicted_rating >= min_rating:
-                    restaurant = self.df[self.df['place_id'] == place_id]
-                    if len(restaurant) > 0:
-                        restaurant = restaurant.iloc[0]
-                        recommendations.append({
-                            'place_id': place_id,
-                            'name': restaurant['name'],
-                            'cuisine_type': restaurant['cuisine_type'],
-                            'restaurant_type': restaurant.get('restaurant_type', 'Restaurant'),
-                            'rating': restaurant['rating'],
-                            'review_count': restaurant['review_count'],
-                            'price_range': restaurant['price_range'],
-                            'price_level': restaurant.get('price_level', None),
-                            'atmosphere': restaurant['atmosphere'],
-                            'amenities': restaurant.get('amenities', ''),
-                            'address': restaurant['address'],
-                            'latitude': restaurant['latitude'],
-                            'longitude': restaurant['longitude'],
-                            'predicted_rating': round(predicted_rating, 2)
-                        })
-        
-        recommendations = sorted(recommendations, key=lambda x: x['predicted_rating'], reverse=True)[:n]
-        return pd.DataFrame(recommendations) if recommendations else "No recommendations found."
+        neighbours = self.user_similarity_matrix[user]
+        neighbour_ratings = self.user_item_matrix[neighbours.indices]
+        similarities = neighbours.data.astype(float)
+        
+        # Similarity-weighted rating sums for every restaurant in one sparse-dense product
+        weighted_sum = neighbour_ratings.T @ similarities
+        similarity_sum = (neighbour_ratings > 0).astype(float).T @ similarities
+        predicted = np.divide(weighted_sum, similarity_sum,
+                              out=np.zeros_like(weighted_sum), where=similarity_sum > 0)
+        
+        candidates = (similarity_sum > 0) & (predicted >= min_rating)
+        candidates[self.user_item_matrix[user].indices] = False
+        items = np.flatnonzero(candidates)
+        
+        place_positions = pd.Series(np.arange(len(self.df)), index=self.df['place_id'])
+        place_positions = place_positions[~place_positions.index.duplicated()]
+        positions = place_positions.reindex(self.cf_items[items]).to_numpy()
+        found = ~np.isnan(positions)
+        items, positions = items[found], positions[found].astype(int)
+        
+        if len(items) == 0:
+            return "No recommendations found."
+        
+        predicted_rating = np.round(predicted[items], 2)
+        top = np.argsort(-predicted_rating, kind='stable')[:n]
+        rows = self.df.iloc[positions[top]]
+        
+        def column(name, default):
+            return rows[name].to_numpy() if name in rows.columns else default
+        
+        return pd.DataFrame({
+            'place_id': np.asarray(self.cf_items[items[top]]),
+            'name': rows['name'].to_numpy(),
+            'cuisine_type': rows['cuisine_type'].to_numpy(),
+            'restaurant_type': column('restaurant_type', 'Restaurant'),
+            'rating': rows['rating'].to_numpy(),
+            'review_count': rows['review_count'].to_numpy(),
+            'price_range': rows['price_range'].to_numpy(),
+            'price_level': column('price_level', None),
+            'atmosphere': rows['atmosphere'].to_numpy(),
+            'amenities': column('amenities', ''),
+            'address': rows['address'].to_numpy(),
+            'latitude': rows['latitude'].to_numpy(),
+            'longitude': rows['longitude'].to_numpy(),
+            'predicted_rating': predicted_rating[top]
+        })
     
     def get_hybrid_recommendations(self, restaurant_name=None, username=None, 
                                   n=10, content_weight=0.5, collaborative_weight=0.5):
@@ -945,6 +1399,7 @@ if __name__ == "__main__":
                 
                 print("\nSaving model...")
                 recommender.save_model(model_filepath)
+                recommender.save_artifact(os.path.splitext(model_filepath)[0])
                 
             except FileNotFoundError as e:
                 print(f"\n❌ Error: Could not find data files!")
@@ -969,6 +1424,7 @@ if __name__ == "__main__":
             
             print("\nSaving model...")
             recommender.save_model(model_filepath)
+            recommender.save_artifact(os.path.splitext(model_filepath)[0])
             
         except FileNotFoundError as e:
             print(f"\n❌ Error: Could not find data files!")
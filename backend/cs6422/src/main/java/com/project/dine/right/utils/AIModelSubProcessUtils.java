@@ -1,23 +1,45 @@
 package com.project.dine.right.utils;
 
 import com.fasterxml.jackson.core.type.TypeReference;
+import com.fasterxml.jackson.databind.JsonNode;
 import com.fasterxml.jackson.databind.ObjectMapper;
 import com.project.dine.right.dto.AIModelRequestDTO;
 import jakarta.annotation.PostConstruct;
+import jakarta.annotation.PreDestroy;
 import org.springframework.beans.factory.annotation.Value;
 import org.springframework.stereotype.Service;
 
 import java.io.BufferedReader;
+import java.io.BufferedWriter;
+import java.io.IOException;
 import java.io.InputStreamReader;
+import java.io.OutputStreamWriter;
 import java.util.List;
+import java.util.concurrent.ExecutionException;
+import java.util.concurrent.ExecutorService;
+import java.util.concurrent.Executors;
+import java.util.concurrent.Future;
+import java.util.concurrent.TimeUnit;
+import java.util.concurrent.TimeoutException;
 
 @Service
 public class AIModelSubProcessUtils {
 
     private static final ObjectMapper mapper = new ObjectMapper();
+    private static final String SERVE_FLAG = "--serve";
+    private static final String READY_STATUS = "ready";
+    private static final ExecutorService readerExecutor = Executors.newSingleThreadExecutor(runnable -> {
+        var thread = new Thread(runnable, "inference-reader");
+        thread.setDaemon(true);
+        return thread;
+    });
     private static Process process;
+    private static BufferedReader processReader;
+    private static BufferedWriter processWriter;
     private static String inferenceFilePath;
     private static String envPath;
+    private static long startupTimeoutSeconds;
+    private static long responseTimeoutSeconds;
     @Value("${model.env.path}")
     private String env;
     @Value("${model.inf.file.path}")
@@ -26,23 +48,95 @@ public class AIModelSubProcessUtils {
     private Long resultLimit;
     @Value("${model.results.key}")
     private String resultsKey;
+    @Value("${model.startup.timeout.seconds:120}")
+    private long startupTimeout;
+    @Value("${model.response.timeout.seconds:30}")
+    private long responseTimeout;
 
-    private static synchronized Process getProcess() {
-        try {
-            if (process == null || !process.isAlive()) {
-                var processBuilder = new ProcessBuilder(envPath, inferenceFilePath);
-                processBuilder.redirectErrorStream(true);
-                process = processBuilder.start();
+    /**
+     * Starts the inference script in serve mode (if it is not already running) and waits
+     * for its readiness line, so the model is loaded once and reused across requests.
+     */
+    private static synchronized Process getProcess() throws IOException {
+        if (process == null || !process.isAlive()) {
+            var processBuilder = new ProcessBuilder(envPath, inferenceFilePath, SERVE_FLAG);
+            processBuilder.redirectError(ProcessBuilder.Redirect.INHERIT);
+            process = processBuilder.start();
+            processWriter = new BufferedWriter(new OutputStreamWriter(process.getOutputStream()));
+            processReader = new BufferedReader(new InputStreamReader(process.getInputStream()));
+
+            var ready = readResponse(startupTimeoutSeconds);
+            if (ready == null || !READY_STATUS.equals(ready.path("status").asText())) {
+                killProcess();
+                throw new IOException("Inference process did not become ready");
             }
-        } catch (Exception ignored) {
         }
         return process;
     }
 
+    /**
+     * Reads the next JSON line written by the inference process, skipping any stray output.
+     */
+    private static JsonNode readResponse() throws IOException {
+        String line;
+        while ((line = processReader.readLine()) != null) {
+            try {
+                var node = mapper.readTree(line);
+                if (node != null && node.isObject()) {
+                    return node;
+                }
+            } catch (IOException ignored) {
+            }
+        }
+        return null;
+    }
+
+    /**
+     * Reads the next response, waiting at most timeoutSeconds. A process that is alive but
+     * does not answer in time is killed and cleared, so the next call starts a fresh one.
+     */
+    private static JsonNode readResponse(long timeoutSeconds) throws IOException {
+        Future<JsonNode> pending = readerExecutor.submit(AIModelSubProcessUtils::readResponse);
+        try {
+            return pending.get(timeoutSeconds, TimeUnit.SECONDS);
+        } catch (TimeoutException e) {
+            // killing the process closes its stdout, which also ends the blocked readLine()
+            killProcess();
+            pending.cancel(true);
+            throw new IOException("Inference process did not answer within " + timeoutSeconds + "s", e);
+        } catch (ExecutionException e) {
+            killProcess();
+            throw new IOException("Reading from the inference process failed", e.getCause());
+        } catch (InterruptedException e) {
+            Thread.currentThread().interrupt();
+            killProcess();
+            throw new IOException("Interrupted while waiting for the inference process", e);
+        }
+    }
+
+    private static void killProcess() {
+        if (process != null) {
+            process.destroyForcibly();
+            process = null;
+        }
+    }
+
     @PostConstruct
     public void init() {
         inferenceFilePath = inference;
         envPath = env;
+        startupTimeoutSeconds = startupTimeout;
+        responseTimeoutSeconds = responseTimeout;
+    }
+
+    @PreDestroy
+    public void shutdown() {
+        synchronized (AIModelSubProcessUtils.class) {
+            if (process != null && process.isAlive()) {
+                process.destroy();
+            }
+        }
+        readerExecutor.shutdownNow();
     }
 
     public List<Long> getRecommendations(AIModelRequestDTO aiModelRequestDTO) {
@@ -51,21 +145,22 @@ public class AIModelSubProcessUtils {
 
             aiModelRequestDTO.setN(resultLimit);
 
-            var process = getProcess();
+            JsonNode response;
+            synchronized (AIModelSubProcessUtils.class) {
+                getProcess();
 
-            try (var outputStream = process.getOutputStream()) {
-                mapper.writeValue(outputStream, aiModelRequestDTO);
+                processWriter.write(mapper.writeValueAsString(aiModelRequestDTO));
+                processWriter.newLine();
+                processWriter.flush();
+
+                response = readResponse(responseTimeoutSeconds);
             }
 
-            var output = new StringBuilder();
-            try (var reader = new BufferedReader(new InputStreamReader(process.getInputStream()))) {
-                String line;
-                while ((line = reader.readLine()) != null) {
-                    output.append(line);
-                }
+            if (response == null) {
+                return null;
             }
 
-            return mapper.convertValue(mapper.readTree(output.toString()).get(resultsKey), new TypeReference<>() {
+            return mapper.convertValue(response.get(resultsKey), new TypeReference<>() {
             });
 
         } catch (Exception ignored) {
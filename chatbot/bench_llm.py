@@ -0,0 +1,138 @@
+# bench_llm.py
+# Throughput, memory and answer-quality comparison of the generation backends.
+#
+# Every backend runs in its own subprocess (so resident memory is not shared between
+# them) over the same retrieved-context prompts, one prompt at a time with a fixed
+# seed. Quality is measured against the fp32 answers: token-overlap F1, and how many
+# of the restaurants fp32 names are also named. Example:
+#   python bench_llm.py --backends fp32 int8 onnx --threads 4 --max-new-tokens 128
+import argparse
+import json
+import re
+import subprocess
+import sys
+import time
+
+QUERIES = [
+    "Recommend affordable Irish cafes in Cork with a casual atmosphere",
+    "Where can I get vegan food in the city centre?",
+    "I want a lively pub with live music rated above 4.5",
+    "Any good Italian restaurants under €20?",
+    "Suggest a quiet place for coffee and cake near Douglas",
+    "Which restaurants offer delivery and halal options?",
+    "Best rated Japanese food in Cork",
+    "A cheap lunch spot near University College",
+]
+
+
+def rss_mb():
+    # Current resident set size of this process (Linux)
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024.0
+    return None
+
+
+def run_backend(backend, threads, max_new_tokens, top_k):
+    # Runs inside the worker subprocess; returns one JSON-serialisable result
+    import torch
+    from chatbot_engine import ChatbotEngine
+
+    engine = ChatbotEngine(max_batch_size=1, llm_backend=backend, llm_threads=threads)
+    engine.kv_cache = None  # compare the backends themselves, without prefill reuse
+    engine.load_index()
+    engine.load_embedder()
+    prompts = [engine.build_prompt(q, top_k=top_k)[0] for q in QUERIES]
+    rss_before = rss_mb()
+    engine.load_llm()
+    rss_after = rss_mb()
+
+    answers = []
+    seconds = []
+    total_tokens = 0
+    for prompt in prompts:
+        torch.manual_seed(0)
+        start = time.perf_counter()
+        reply, n_tokens = engine.generate_one(prompt, max_new_tokens=max_new_tokens, temperature=0.2)
+        seconds.append(time.perf_counter() - start)
+        total_tokens += n_tokens
+        answers.append(reply)
+
+    return {
+        "backend": engine.llm_backend,
+        "load_seconds": engine.load_seconds.get("llm"),
+        "model_rss_mb": rss_after - rss_before if rss_before is not None else None,
+        "peak_rss_mb": rss_mb(),
+        "tokens_per_second": total_tokens / sum(seconds) if sum(seconds) else None,
+        "mean_seconds": sum(seconds) / len(seconds),
+        "answers": answers,
+    }
+
+
+def tokens(text):
+    return re.findall(r"\w+", text.lower())
+
+
+def overlap_f1(answer, reference):
+    a, r = tokens(answer), tokens(reference)
+    if not a or not r:
+        return float(a == r)
+    common = sum(min(a.count(t), r.count(t)) for t in set(a))
+    if not common:
+        return 0.0
+    precision, recall = common / len(a), common / len(r)
+    return 2 * precision * recall / (precision + recall)
+
+
+def named_places(answer, reference):
+    # Fraction of the capitalised names in the reference answer that the answer also names
+    names = set(re.findall(r"(?:[A-Z][\w'&]+ ){0,3}[A-Z][\w'&]+", reference))
+    if not names:
+        return None
+    return sum(name in answer for name in names) / len(names)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare LLM generation backends on CPU")
+    parser.add_argument("--backends", nargs="+", default=["fp32", "int8", "onnx"])
+    parser.add_argument("--threads", type=int, default=0, help="Intra-op threads (0 = library default)")
+    parser.add_argument("--max-new-tokens", type=int, default=128)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_backend(args.worker, args.threads, args.max_new_tokens, args.top_k)))
+        return
+
+    backends = args.backends if "fp32" in args.backends else ["fp32"] + args.backends
+    results = {}
+    for backend in backends:
+        print(f"Running {backend}...", file=sys.stderr)
+        proc = subprocess.run(
+            [sys.executable, __file__, "--worker", backend, "--threads", str(args.threads),
+             "--max-new-tokens", str(args.max_new_tokens), "--top-k", str(args.top_k)],
+            capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            print(f"{backend} failed:\n{proc.stderr[-2000:]}", file=sys.stderr)
+            continue
+        results[backend] = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    reference = results.get("fp32", {}).get("answers")
+    print(f"\n{len(QUERIES)} prompts, max_new_tokens={args.max_new_tokens}, threads={args.threads or 'default'}\n")
+    print(f"{'backend':<10}{'used':<10}{'tok/s':>8}{'mean s':>9}{'load s':>9}{'model MB':>10}{'peak MB':>9}{'F1':>7}{'names':>7}")
+    for backend, r in results.items():
+        f1 = names = float("nan")
+        if reference:
+            f1 = sum(overlap_f1(a, ref) for a, ref in zip(r["answers"], reference)) / len(reference)
+            scores = [s for s in (named_places(a, ref) for a, ref in zip(r["answers"], reference)) if s is not None]
+            names = sum(scores) / len(scores) if scores else float("nan")
+        print(f"{backend:<10}{r['backend']:<10}{r['tokens_per_second'] or 0:>8.2f}{r['mean_seconds']:>9.2f}"
+              f"{r['load_seconds'] or 0:>9.1f}{r['model_rss_mb'] or 0:>10.0f}{r['peak_rss_mb'] or 0:>9.0f}"
+              f"{f1:>7.3f}{names:>7.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,31 @@
 # build_index.py
+import argparse
+import hashlib
+import os
+import shutil
+import sqlite3
 import pandas as pd
 import json
+import math
+import time
 import numpy as np
-from sentence_transformers import SentenceTransformer
 import faiss
 from pathlib import Path
 
-CSV_PATH = "/Users/harinisri/Documents/Restraurant-project/Chatbot_dataset.csv"   
+CSV_PATH = "/Users/harinisri/Documents/Restraurant-project/Chatbot_dataset.csv"
 INDEX_DIR = Path("index_data")
-INDEX_DIR.mkdir(exist_ok=True)
+EMBED_MODEL = "all-MiniLM-L6-v2"
 
-# Load dataset
-df = pd.read_csv(CSV_PATH, dtype=str).fillna("")
+# Index types: exhaustive "flat", or approximate "ivf-flat", "ivf-pq" and "hnsw".
+# Every type uses inner product over L2-normalised embeddings (= cosine similarity).
+INDEX_TYPES = ("flat", "ivf-flat", "ivf-pq", "hnsw")
+
+# Index types whose vectors can be removed in place; HNSW is rebuilt from saved embeddings
+REMOVABLE_INDEX_TYPES = ("flat", "ivf-flat", "ivf-pq")
+
+# Each build is written to its own version directory; CURRENT names the live one
+CURRENT_FILE = "CURRENT"
+KEEP_VERSIONS = 2
 
 # helper to make a single descriptive text for a restaurant row
 def row_to_text(row):
@@ -41,45 +55,268 @@ def row_to_text(row):
     return text
 
 
-# Build texts list and metadata
-texts = []
-meta = []
-for _, row in df.iterrows():
-    t = row_to_text(row.to_dict())
-    texts.append(t)
-    meta.append({
-    "name": row.get("name", ""),
-    "place_id": row.get("place_id", ""),
-    "restaurant_type": row.get("restaurant_type", ""),
-    "cuisine_type": row.get("cuisine_type", ""),
-    "address": row.get("address", ""),
-    "rating": row.get("rating", ""),
-    "review_count": row.get("review_count", ""),
-    "price_range": row.get("price_range", ""),
-    "phone": row.get("Phone_number", ""),
-    "website": row.get("website", ""),
-    "url": row.get("url", ""),
-    "atmosphere": row.get("atmosphere", ""),
-    "dietary_options": row.get("dietary_options", ""),
-    "service_options": row.get("service_options", ""),
-    "amenities": row.get("amenities", ""),
-    "raw_row": row.to_dict()
-    })
-
-# Create embeddings
-print("Loading embedding model...")
-embedder = SentenceTransformer("all-MiniLM-L6-v2")
-print("Creating embeddings...")
-embeddings = embedder.encode(texts, show_progress_bar=True, convert_to_numpy=True)
-
-# Save embeddings to FAISS
-d = embeddings.shape[1]
-index = faiss.IndexFlatL2(d)
-index.add(embeddings)
-faiss.write_index(index, str(INDEX_DIR / "faiss_index.bin"))
-np.save(INDEX_DIR / "texts.npy", np.array(texts, dtype=object))
-with open(INDEX_DIR / "meta.jsonl", "w", encoding="utf-8") as fout:
-    for m in meta:
-        fout.write(json.dumps(m) + "\n")
-
-print("Index built and saved to", INDEX_DIR)
+# Stable 63-bit FAISS id for a place_id, so vectors keep their id across builds
+def place_faiss_id(place_id):
+    return int.from_bytes(hashlib.sha1(str(place_id).encode("utf-8")).digest()[:8], "big") & (2**63 - 1)
+
+
+# Hash of everything indexed for a row; a changed hash means the row must be re-embedded
+def content_hash(text, meta):
+    return hashlib.sha1((text + json.dumps(meta, sort_keys=True)).encode("utf-8")).hexdigest()
+
+
+# Directory holding the live build: the version named in CURRENT, or index_dir itself for old layouts
+def resolve_index_dir(index_dir):
+    index_dir = Path(index_dir)
+    current = index_dir / CURRENT_FILE
+    if current.exists():
+        return index_dir / current.read_text(encoding="utf-8").strip()
+    return index_dir
+
+
+# Default IVF list count: ~4*sqrt(n), but keep >= 39 training points per list as faiss recommends
+def default_nlist(n_vectors):
+    return max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // 39))
+
+
+# faiss index_factory description and search-time parameters for an index type
+def index_spec(index_type, n_vectors, dim, nlist=None, pq_m=None, hnsw_m=32, nprobe=None, ef_search=64):
+    if index_type == "flat":
+        return "IDMap2,Flat", {}
+    if index_type in ("ivf-flat", "ivf-pq"):
+        nlist = nlist or default_nlist(n_vectors)
+        params = {"nprobe": nprobe or max(1, nlist // 8)}
+        if index_type == "ivf-flat":
+            return f"IVF{nlist},Flat", params
+        # PQ sub-quantizers must divide the dimension; 8-bit codes need >= 256 training points
+        pq_m = pq_m or next(m for m in (48, 32, 24, 16, 12, 8, 4, 2, 1) if dim % m == 0 and m <= dim // 8)
+        nbits = 8 if n_vectors >= 256 * 39 else max(4, min(8, int(math.log2(max(n_vectors, 16) / 39))))
+        return f"IVF{nlist},PQ{pq_m}x{nbits}", params
+    if index_type == "hnsw":
+        return f"IDMap2,HNSW{hnsw_m}", {"efSearch": ef_search}
+    raise ValueError(f"Unknown index type: {index_type} (choose from {', '.join(INDEX_TYPES)})")
+
+
+# Apply nprobe / efSearch to a loaded index
+def set_search_params(index, params):
+    space = faiss.ParameterSpace()
+    for name, value in params.items():
+        space.set_index_parameter(index, name, value)
+
+
+# Build (and train, for IVF types) an inner-product index over normalised embeddings,
+# storing each vector under its id (row positions when ids is None)
+def build_faiss_index(embeddings, index_type="flat", ids=None, train_sample=50000, seed=0, **spec_kwargs):
+    n_vectors, dim = embeddings.shape
+    factory, params = index_spec(index_type, n_vectors, dim, **spec_kwargs)
+    index = faiss.index_factory(dim, factory, faiss.METRIC_INNER_PRODUCT)
+
+    if not index.is_trained:
+        rng = np.random.default_rng(seed)
+        sample = embeddings
+        if n_vectors > train_sample:
+            sample = embeddings[rng.choice(n_vectors, train_sample, replace=False)]
+        index.train(sample)
+
+    if ids is None:
+        ids = np.arange(n_vectors)
+    index.add_with_ids(embeddings, np.asarray(ids, dtype="int64"))
+    set_search_params(index, params)
+    return index, factory, params
+
+
+def normalize(embeddings):
+    embeddings = np.ascontiguousarray(embeddings, dtype="float32")
+    faiss.normalize_L2(embeddings)
+    return embeddings
+
+
+# Previous versioned build (index, embeddings, ids, hashes, manifest), or None
+def load_previous_build(index_dir):
+    build_dir = resolve_index_dir(index_dir)
+    if build_dir == Path(index_dir) or not (build_dir / "hashes.npy").exists():
+        return None
+    return {
+        "manifest": json.loads((build_dir / "manifest.json").read_text(encoding="utf-8")),
+        "index": faiss.read_index(str(build_dir / "faiss_index.bin")),
+        "embeddings": np.load(build_dir / "embeddings.npy"),
+        "ids": np.load(build_dir / "ids.npy"),
+        "hashes": np.load(build_dir / "hashes.npy"),
+    }
+
+
+# records.sqlite: one row per record keyed by its FAISS id, with the record text and one
+# column per metadata field; "position" is the record's row in embeddings.npy
+def write_records(path, ids, texts, meta):
+    fields = list(meta[0]) if meta else []
+    columns = ["faiss_id INTEGER PRIMARY KEY", "position INTEGER NOT NULL UNIQUE", "text TEXT NOT NULL"]
+    columns += [f'"{field}" TEXT' for field in fields]
+    conn = sqlite3.connect(str(path))
+    try:
+        conn.execute(f"CREATE TABLE records ({', '.join(columns)})")
+        conn.executemany(
+            f"INSERT INTO records VALUES ({', '.join('?' * len(columns))})",
+            ((int(fid), position, text, *(str(m.get(field, "")) for field in fields))
+             for position, (fid, text, m) in enumerate(zip(ids, texts, meta)))
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+# Write a complete build into a fresh version directory, then switch CURRENT to it atomically
+def write_build(index_dir, index, embeddings, ids, hashes, texts, meta, manifest):
+    index_dir = Path(index_dir)
+    version = time.strftime("v%Y%m%d-%H%M%S")
+    while (index_dir / version).exists():
+        version += "a"
+    manifest["version"] = version
+    tmp_dir = index_dir / (version + ".tmp")
+    tmp_dir.mkdir(parents=True)
+
+    faiss.write_index(index, str(tmp_dir / "faiss_index.bin"))
+    np.save(tmp_dir / "embeddings.npy", embeddings)
+    np.save(tmp_dir / "ids.npy", np.asarray(ids, dtype="int64"))
+    np.save(tmp_dir / "hashes.npy", np.asarray(hashes, dtype="U40"))
+    write_records(tmp_dir / "records.sqlite", ids, texts, meta)
+    with open(tmp_dir / "manifest.json", "w", encoding="utf-8") as fout:
+        json.dump(manifest, fout, indent=2)
+
+    os.rename(tmp_dir, index_dir / version)
+    current_tmp = index_dir / (CURRENT_FILE + ".tmp")
+    current_tmp.write_text(version, encoding="utf-8")
+    os.replace(current_tmp, index_dir / CURRENT_FILE)
+
+    # keep the newest few versions so a process still reading an older one is not cut off
+    versions = sorted(p for p in index_dir.glob("v*") if p.is_dir() and not p.name.endswith(".tmp"))
+    for old in versions[:-KEEP_VERSIONS]:
+        shutil.rmtree(old, ignore_errors=True)
+    return version
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the chatbot restaurant vector index")
+    parser.add_argument("--csv", default=CSV_PATH, help="Chatbot dataset CSV")
+    parser.add_argument("--out", default=str(INDEX_DIR), help="Output directory")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="flat")
+    parser.add_argument("--nlist", type=int, help="IVF lists (default ~4*sqrt(n))")
+    parser.add_argument("--nprobe", type=int, help="IVF lists searched per query (default nlist/8)")
+    parser.add_argument("--pq-m", type=int, help="PQ sub-quantizers for ivf-pq")
+    parser.add_argument("--hnsw-m", type=int, default=32, help="HNSW neighbours per node")
+    parser.add_argument("--ef-search", type=int, default=64, help="HNSW search beam width")
+    parser.add_argument("--train-sample", type=int, default=50000, help="Max vectors used to train IVF")
+    parser.add_argument("--full", action="store_true", help="Re-embed every row instead of updating the last build")
+    args = parser.parse_args()
+
+    index_dir = Path(args.out)
+    index_dir.mkdir(exist_ok=True)
+
+    # Load dataset
+    df = pd.read_csv(args.csv, dtype=str).fillna("")
+    if df["place_id"].duplicated().any():
+        print(f"Dropping {df['place_id'].duplicated().sum()} rows with duplicate place_id")
+        df = df.drop_duplicates("place_id", keep="first")
+
+    # Build texts list and metadata
+    texts = []
+    meta = []
+    for _, row in df.iterrows():
+        t = row_to_text(row.to_dict())
+        texts.append(t)
+        meta.append({
+        "name": row.get("name", ""),
+        "place_id": row.get("place_id", ""),
+        "restaurant_type": row.get("restaurant_type", ""),
+        "cuisine_type": row.get("cuisine_type", ""),
+        "address": row.get("address", ""),
+        "rating": row.get("rating", ""),
+        "review_count": row.get("review_count", ""),
+        "price_range": row.get("price_range", ""),
+        "phone": row.get("Phone_number", ""),
+        "website": row.get("website", ""),
+        "url": row.get("url", ""),
+        "atmosphere": row.get("atmosphere", ""),
+        "dietary_options": row.get("dietary_options", ""),
+        "service_options": row.get("service_options", ""),
+        "amenities": row.get("amenities", ""),
+        })
+
+    ids = np.array([place_faiss_id(m["place_id"]) for m in meta], dtype="int64")
+    hashes = [content_hash(t, m) for t, m in zip(texts, meta)]
+
+    # Reuse the previous build when it is compatible: only new or changed rows are embedded
+    previous = None if args.full else load_previous_build(index_dir)
+    if previous is not None and (previous["manifest"].get("index_type") != args.index_type
+                                 or previous["manifest"].get("embed_model") != EMBED_MODEL):
+        print("Index type or embedding model changed; rebuilding from scratch")
+        previous = None
+
+    old_rows = {} if previous is None else {int(fid): row for row, fid in enumerate(previous["ids"])}
+    to_embed = []
+    reused = []
+    for row, (fid, h) in enumerate(zip(ids.tolist(), hashes)):
+        old_row = old_rows.get(fid)
+        if old_row is not None and previous["hashes"][old_row] == h:
+            reused.append((row, old_row))
+        else:
+            to_embed.append(row)
+    removed = sorted(set(old_rows) - set(ids.tolist()))
+    changed = [int(ids[row]) for row in to_embed if int(ids[row]) in old_rows]
+    print(f"{len(to_embed) - len(changed)} new, {len(changed)} changed, {len(removed)} removed, {len(reused)} unchanged rows")
+
+    # Create embeddings (only for rows that need them)
+    dim = previous["embeddings"].shape[1] if previous is not None else None
+    new_embeddings = None
+    if to_embed:
+        from sentence_transformers import SentenceTransformer
+        print("Loading embedding model...")
+        embedder = SentenceTransformer(EMBED_MODEL)
+        print("Creating embeddings...")
+        new_embeddings = normalize(embedder.encode([texts[row] for row in to_embed], show_progress_bar=True, convert_to_numpy=True))
+        dim = new_embeddings.shape[1]
+    embeddings = np.zeros((len(texts), dim), dtype="float32")
+    if reused:
+        rows, old = zip(*reused)
+        embeddings[list(rows)] = previous["embeddings"][list(old)]
+    if to_embed:
+        embeddings[to_embed] = new_embeddings
+
+    # Save embeddings to FAISS: update the previous index in place where the type allows it
+    start = time.time()
+    if previous is not None and args.index_type in REMOVABLE_INDEX_TYPES:
+        index = previous["index"]
+        factory = previous["manifest"]["factory"]
+        params = previous["manifest"]["search_params"]
+        if removed or changed:
+            index.remove_ids(np.array(removed + changed, dtype="int64"))
+        if to_embed:
+            index.add_with_ids(new_embeddings, ids[to_embed])
+        print(f"Updated {factory} index to {index.ntotal} vectors in {time.time() - start:.2f}s")
+    else:
+        index, factory, params = build_faiss_index(
+            embeddings, args.index_type, ids=ids, train_sample=args.train_sample, nlist=args.nlist, nprobe=args.nprobe,
+            pq_m=args.pq_m, hnsw_m=args.hnsw_m, ef_search=args.ef_search
+        )
+        print(f"Built {factory} index over {index.ntotal} vectors in {time.time() - start:.2f}s")
+
+    # Manifest read by chatbot_engine to know how to query the index
+    manifest = {
+        "index_type": args.index_type,
+        "factory": factory,
+        "metric": "inner_product",
+        "normalized": True,
+        "dim": int(dim),
+        "n_vectors": int(index.ntotal),
+        "embed_model": EMBED_MODEL,
+        "search_params": params,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "incremental": previous is not None,
+        "changes": {"added": len(to_embed) - len(changed), "updated": len(changed), "removed": len(removed)},
+    }
+    version = write_build(index_dir, index, embeddings, ids, hashes, texts, meta, manifest)
+
+    print(f"Index built and saved to {index_dir / version}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+# context_builder.py
+# Token-budgeted prompt assembly for the chatbot engines.
+#
+# The prompt and the reply have to fit the model's context window. The system text and
+# the question always go in; the tokens left over are shared between the retrieved
+# records (in rank order, each cut down to the fields the question is about) and the
+# conversation history (the latest messages word for word, older ones as a one-line
+# summary each). Whatever does not fit is left out whole, instead of the tokenizer
+# silently cutting off the end of the prompt.
+import math
+import os
+import re
+
+CONTEXT_TOKENS = int(os.environ.get("CHATBOT_CONTEXT_TOKENS", "2048"))
+REPLY_MAX_TOKENS = int(os.environ.get("CHATBOT_REPLY_TOKENS", "300"))
+HISTORY_SHARE = float(os.environ.get("CHATBOT_HISTORY_SHARE", "0.25"))  # of the tokens left after system text + question
+HISTORY_VERBATIM = int(os.environ.get("CHATBOT_HISTORY_VERBATIM", "2"))  # most recent messages kept word for word
+SUMMARY_WORDS = 16
+FIELD_MAX_CHARS = 120
+
+# Fields every record shows: the system instruction asks for name, price and rating
+BASE_FIELDS = ("cuisine_type", "price_range", "rating")
+# Other fields are shown only when the question mentions something they answer
+FIELD_KEYWORDS = {
+    "restaurant_type": r"caf[eé]s?|pubs?|bars?|bistros?|bakery|bakeries|type",
+    "address": r"near|nearby|around|where|located|location|address|area|street|centre|center|city",
+    "review_count": r"reviews?|reviewed|popular",
+    "atmosphere": r"atmosphere|vibe|ambien[ct]e|quiet|lively|romantic|casual|cos[yi]|family|formal|relaxed",
+    "dietary_options": r"vegan|vegetarian|halal|gluten|dietary|kosher|dairy|non-veg",
+    "service_options": r"deliver(?:y|s)?|takeaway|take-?away|take away|dine-?in|reservations?|book(?:ing)?",
+    "amenities": r"wi-?fi|parking|outdoor|terrace|music|wheelchair|accessible|amenit(?:y|ies)|seating|kids|dogs?",
+    "phone": r"phone|call|number|contact",
+    "website": r"website|site|online|link|url",
+}
+FIELD_PATTERNS = {field: re.compile(r"\b(?:" + words + r")\b") for field, words in FIELD_KEYWORDS.items()}
+FIELD_LABELS = {
+    "restaurant_type": "Type", "cuisine_type": "Cuisine", "address": "Address", "price_range": "Price",
+    "rating": "Rating", "review_count": "Reviews", "atmosphere": "Atmosphere", "dietary_options": "Dietary",
+    "service_options": "Services", "amenities": "Amenities", "phone": "Phone", "website": "Website",
+}
+FIELD_ORDER = tuple(FIELD_LABELS)
+EMPTY_VALUES = {"", "nan", "none", "n/a", "not available", "address not available"}
+
+
+def approx_tokens(text):
+    # Conservative estimate (~3 characters per token) when the model's tokenizer is not at hand
+    return math.ceil(len(text) / 3)
+
+
+def fields_for_question(question, extra_fields=()):
+    # Record fields worth showing for this question, in display order; extra_fields come
+    # from the caller's own parse of the question (e.g. the address when it names an area)
+    q = question.lower()
+    wanted = set(BASE_FIELDS) | set(extra_fields)
+    wanted |= {field for field, pattern in FIELD_PATTERNS.items() if pattern.search(q)}
+    return [field for field in FIELD_ORDER if field in wanted]
+
+
+def format_record(i, meta, fields):
+    parts = [f"{i}. {meta.get('name', '')}"]
+    for field in fields:
+        value = str(meta.get(field) or "").strip()
+        if value.lower() in EMPTY_VALUES:
+            continue
+        if len(value) > FIELD_MAX_CHARS:
+            value = value[:FIELD_MAX_CHARS].rsplit(" ", 1)[0] + "..."
+        parts.append(f"{FIELD_LABELS[field]}: {value}")
+    return " | ".join(parts)
+
+
+def format_records_for_prompt(retrieved, fields=FIELD_ORDER):
+    return "\n".join(format_record(i, r["meta"], fields) for i, r in enumerate(retrieved, start=1))
+
+
+def summarize_message(msg):
+    # One line per older message: its role and first SUMMARY_WORDS words
+    words = msg.get("text", "").split()
+    text = " ".join(words[:SUMMARY_WORDS]) + (" ..." if len(words) > SUMMARY_WORDS else "")
+    return f"{msg.get('role', 'user').upper()} (earlier): {text}"
+
+
+class ContextBuilder:
+    """Fits system text, history and records into `context_tokens` minus the reply.
+
+    `count_tokens` should be the generating model's tokenizer; approx_tokens()
+    stands in where it is not available (e.g. a model behind an HTTP API).
+    """
+
+    def __init__(self, count_tokens=approx_tokens, context_tokens=CONTEXT_TOKENS,
+                 history_share=HISTORY_SHARE, history_verbatim=HISTORY_VERBATIM):
+        self.count_tokens = count_tokens
+        self.context_tokens = context_tokens
+        self.history_share = history_share
+        self.history_verbatim = history_verbatim
+
+    def _fit_lines(self, lines, budget):
+        # Longest prefix of `lines` whose joined text is within budget; returns (lines, tokens)
+        kept, used = [], 0
+        for line in lines:
+            cost = self.count_tokens(line) + 1  # + the newline
+            if used + cost > budget:
+                break
+            kept.append(line)
+            used += cost
+        return kept, used
+
+    def _history_lines(self, history, budget):
+        # Newest first: verbatim for the latest messages, a summary line once over that or the budget.
+        # Returns (lines, tokens, whether each line is a summary), oldest first
+        lines, used, summaries = [], 0, []
+        for n, msg in enumerate(reversed(history)):
+            verbatim = f"{msg.get('role', 'user').upper()}: {msg.get('text', '')}"
+            summary = summarize_message(msg)
+            for line in ([verbatim, summary] if n < self.history_verbatim else [summary]):
+                cost = self.count_tokens(line) + 1
+                if used + cost <= budget:
+                    lines.append(line)
+                    used += cost
+                    summaries.append(line is summary)
+                    break
+            else:
+                break
+        return lines[::-1], used, summaries[::-1]
+
+    def _clip(self, text, max_tokens):
+        # Longest word prefix of text within max_tokens
+        words = text.split()
+        lo, hi = 0, len(words)
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if self.count_tokens(" ".join(words[:mid])) <= max_tokens:
+                lo = mid
+            else:
+                hi = mid - 1
+        return " ".join(words[:lo])
+
+    def build(self, template, system, question, retrieved, history=None, reply_tokens=REPLY_MAX_TOKENS,
+              extra_fields=()):
+        """Returns (prompt, stats). `template` has {system}, {history}, {user} and {records};
+        `history` is the session's earlier messages, oldest first."""
+        budget = self.context_tokens - reply_tokens
+        history = list(history or [])
+        if history and history[-1].get("role") == "user" and history[-1].get("text", "").strip() == question.strip():
+            history = history[:-1]  # the question itself is already in the prompt
+
+        def render(history_lines, record_lines):
+            history_block = "Conversation so far:\n" + "\n".join(history_lines) + "\n\n" if history_lines else ""
+            records_block = "\n".join(record_lines) if record_lines else "No matching records found."
+            return template.format(system=system, history=history_block, user=question, records=records_block)
+
+        fixed = self.count_tokens(render([], [])) + self.count_tokens("Conversation so far:") + 2
+        if fixed > budget:
+            # An oversized question is cut down explicitly rather than by the tokenizer
+            question = self._clip(question, max(1, self.count_tokens(question) - (fixed - budget)))
+            fixed = self.count_tokens(render([], [])) + self.count_tokens("Conversation so far:") + 2
+        available = max(0, budget - fixed)
+
+        fields = fields_for_question(question, extra_fields)
+        record_lines = [format_record(i, r["meta"], fields) for i, r in enumerate(retrieved, start=1)]
+
+        # Records first, leaving the history its share; then unused record tokens go to the history
+        history_lines, history_used, _ = self._history_lines(history, int(available * self.history_share))
+        records, records_used = self._fit_lines(record_lines, available - history_used)
+        if not records and record_lines:
+            records = [line for line in [self._clip(record_lines[0], available - history_used)] if line]
+        history_lines, history_used, summaries = self._history_lines(history, available - records_used)
+
+        prompt = render(history_lines, records)
+        tokens = self.count_tokens(prompt)
+        while tokens > budget and (len(records) > 1 or history_lines):
+            # Per-line counts can undercount the joined text slightly; drop history, then the lowest-ranked records
+            if history_lines:
+                history_lines, summaries = history_lines[1:], summaries[1:]
+            else:
+                records = records[:-1]
+            prompt = render(history_lines, records)
+            tokens = self.count_tokens(prompt)
+
+        return prompt, {
+            "context_tokens": tokens,
+            "context_budget": budget,
+            "context_records": len(records),
+            "context_records_dropped": len(record_lines) - len(records),
+            "context_history_messages": len(history_lines),
+            "context_history_summarized": sum(summaries),
+            "context_history_dropped": len(history) - len(history_lines),
+        }
@@ -0,0 +1,74 @@
+# eval_index.py
+# Recall-vs-latency comparison of the approximate index types against exact (flat) search.
+#
+# Uses the normalised embeddings saved by build_index.py. A random held-out slice of
+# rows serves as queries and is left out of every index, so queries are never
+# trivially matched to themselves. Example:
+#   python eval_index.py --index-dir index_data --k 5 --nprobe 1 4 16 --ef-search 16 64 256
+import argparse
+import time
+import numpy as np
+import faiss
+
+from build_index import INDEX_DIR, build_faiss_index, resolve_index_dir, set_search_params
+
+
+def search_latencies(index, queries, k):
+    # one query at a time, as the chatbot searches
+    latencies = []
+    results = []
+    for q in queries:
+        start = time.perf_counter()
+        _, ids = index.search(q.reshape(1, -1), k)
+        latencies.append(time.perf_counter() - start)
+        results.append(ids[0])
+    return np.array(results), np.array(latencies) * 1000.0
+
+
+def recall_at_k(found, truth):
+    hits = sum(len(set(f[f >= 0]) & set(t[t >= 0])) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare ANN index types against exact search")
+    parser.add_argument("--index-dir", default=str(INDEX_DIR))
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--holdout", type=float, default=0.1, help="Fraction of rows used as queries")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 32, 64, 128])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    embeddings = np.load(resolve_index_dir(args.index_dir) / "embeddings.npy").astype("float32")
+    rng = np.random.default_rng(args.seed)
+    order = rng.permutation(len(embeddings))
+    n_queries = max(1, int(len(embeddings) * args.holdout))
+    queries, base = embeddings[order[:n_queries]], embeddings[order[n_queries:]]
+    print(f"{len(base)} indexed vectors, {len(queries)} held-out queries, k={args.k}\n")
+
+    flat, flat_factory, _ = build_faiss_index(base, "flat")
+    truth, flat_ms = search_latencies(flat, queries, args.k)
+
+    print(f"{'index':<22}{'params':<16}{'recall@k':>10}{'mean ms':>10}{'p95 ms':>10}{'build s':>10}{'size MB':>10}")
+    rows = [("flat", flat_factory, "-", 1.0, flat_ms, 0.0, flat)]
+
+    for index_type, param, values in [("ivf-flat", "nprobe", args.nprobe),
+                                      ("ivf-pq", "nprobe", args.nprobe),
+                                      ("hnsw", "efSearch", args.ef_search)]:
+        start = time.time()
+        index, factory, _ = build_faiss_index(base, index_type, seed=args.seed)
+        build_seconds = time.time() - start
+        for value in values:
+            set_search_params(index, {param: value})
+            found, ms = search_latencies(index, queries, args.k)
+            rows.append((index_type, factory, f"{param}={value}", recall_at_k(found, truth), ms, build_seconds, index))
+
+    for name, factory, params, recall, ms, build_seconds, index in rows:
+        size_mb = faiss.serialize_index(index).nbytes / (1024 * 1024)
+        print(f"{factory:<22}{params:<16}{recall:>10.3f}{ms.mean():>10.3f}{np.percentile(ms, 95):>10.3f}"
+              f"{build_seconds:>10.2f}{size_mb:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+# session_store.py
+# Conversation history per session id for inference_api.
+#
+# Both stores keep at most `max_messages` messages per session and drop sessions
+# idle for longer than `ttl_seconds`. Expiry runs from a background task (see
+# inference_api) rather than on every request. Pick one with CHAT_SESSION_STORE:
+#   memory - process-local LRU, also bounded by total bytes (default)
+#   sqlite - a SQLite file (CHAT_SESSION_DB) shared by every worker on the host
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+SESSION_STORE = os.environ.get("CHAT_SESSION_STORE", "memory")
+SESSION_DB = os.environ.get("CHAT_SESSION_DB", "sessions.db")
+SESSION_TIMEOUT = float(os.environ.get("CHAT_SESSION_TTL", 60 * 60 * 2))  # 2 hours
+SESSION_MAX_MESSAGES = int(os.environ.get("CHAT_SESSION_MAX_MESSAGES", "20"))
+SESSION_MAX_BYTES = int(float(os.environ.get("CHAT_SESSION_MAX_MB", "64")) * 1024 * 1024)
+
+
+def message_bytes(message):
+    return len(json.dumps(message).encode("utf-8"))
+
+
+class MemorySessionStore:
+    """Process-local sessions in least-recently-active order.
+
+    Sessions over the byte budget are evicted from the least recently active
+    end, and expire() only inspects sessions that are actually stale, so
+    neither costs O(sessions) per request.
+    """
+
+    def __init__(self, ttl_seconds=SESSION_TIMEOUT, max_messages=SESSION_MAX_MESSAGES, max_bytes=SESSION_MAX_BYTES):
+        self.ttl_seconds = ttl_seconds
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.sessions = OrderedDict()  # session_id -> {"history", "bytes", "last_active"}
+        self.bytes = 0
+        self.expired = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+
+    def append(self, session_id, *messages):
+        # Add messages to a session (created if needed); returns a copy of its history
+        with self._lock:
+            session = self.sessions.pop(session_id, None) or {"history": [], "bytes": 0}
+            added = sum(message_bytes(m) for m in messages)
+            session["history"].extend(messages)
+            session["bytes"] += added
+            self.bytes += added
+            while len(session["history"]) > self.max_messages:
+                dropped = message_bytes(session["history"].pop(0))
+                session["bytes"] -= dropped
+                self.bytes -= dropped
+            session["last_active"] = time.time()
+            self.sessions[session_id] = session
+            while self.bytes > self.max_bytes and len(self.sessions) > 1:
+                _, oldest = self.sessions.popitem(last=False)
+                self.bytes -= oldest["bytes"]
+                self.evicted += 1
+            return list(session["history"])
+
+    def get(self, session_id):
+        with self._lock:
+            session = self.sessions.get(session_id)
+            return list(session["history"]) if session else []
+
+    def expire(self):
+        # Drop sessions idle for longer than ttl_seconds; returns how many were dropped
+        cutoff = time.time() - self.ttl_seconds
+        removed = 0
+        with self._lock:
+            while self.sessions:
+                session_id, session = next(iter(self.sessions.items()))
+                if session["last_active"] >= cutoff:
+                    break
+                del self.sessions[session_id]
+                self.bytes -= session["bytes"]
+                removed += 1
+            self.expired += removed
+        return removed
+
+    def stats(self):
+        return {
+            "backend": "memory",
+            "sessions": len(self.sessions),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
+
+
+class SQLiteSessionStore:
+    """Sessions in a SQLite file, so every worker process on a host shares them.
+
+    Uses WAL mode so readers do not block the writer; each thread gets its own
+    connection.
+    """
+
+    def __init__(self, path=SESSION_DB, ttl_seconds=SESSION_TIMEOUT, max_messages=SESSION_MAX_MESSAGES):
+        self.path = str(path)
+        self.ttl_seconds = ttl_seconds
+        self.max_messages = max_messages
+        self.expired = 0
+        self._local = threading.local()
+        conn = self._conn()
+        with conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, last_active REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_last_active ON sessions (last_active)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS messages (seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "session_id TEXT NOT NULL, message TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS messages_session ON messages (session_id, seq)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def append(self, session_id, *messages):
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT INTO sessions VALUES (?, ?) ON CONFLICT(session_id) DO UPDATE SET last_active = excluded.last_active",
+                (session_id, time.time()),
+            )
+            conn.executemany("INSERT INTO messages (session_id, message) VALUES (?, ?)",
+                             [(session_id, json.dumps(m)) for m in messages])
+            conn.execute(
+                "DELETE FROM messages WHERE session_id = ? AND seq NOT IN "
+                "(SELECT seq FROM messages WHERE session_id = ? ORDER BY seq DESC LIMIT ?)",
+                (session_id, session_id, self.max_messages),
+            )
+        return self.get(session_id)
+
+    def get(self, session_id):
+        rows = self._conn().execute("SELECT message FROM messages WHERE session_id = ? ORDER BY seq", (session_id,))
+        return [json.loads(message) for (message,) in rows]
+
+    def expire(self):
+        cutoff = time.time() - self.ttl_seconds
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "DELETE FROM messages WHERE session_id IN (SELECT session_id FROM sessions WHERE last_active < ?)",
+                (cutoff,),
+            )
+            removed = conn.execute("DELETE FROM sessions WHERE last_active < ?", (cutoff,)).rowcount
+        self.expired += removed
+        return removed
+
+    def stats(self):
+        (sessions,) = self._conn().execute("SELECT COUNT(*) FROM sessions").fetchone()
+        return {"backend": "sqlite", "path": self.path, "sessions": sessions, "expired": self.expired}
+
+
+def make_session_store(backend=SESSION_STORE):
+    if backend == "sqlite":
+        return SQLiteSessionStore()
+    if backend == "memory":
+        return MemorySessionStore()
+    raise ValueError(f"Unknown session store: {backend} (choose memory or sqlite)")
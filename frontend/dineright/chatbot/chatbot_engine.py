@@ -1,24 +1,51 @@
+import hashlib
 import json
+import os
+import queue
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
 import numpy as np
 from pathlib import Path
-from sentence_transformers import SentenceTransformer
-import faiss
-import requests
 import time
+from context_builder import CONTEXT_TOKENS, REPLY_MAX_TOKENS, ContextBuilder
+from ollama_client import OLLAMA_URL, OllamaClient
 
 INDEX_DIR = Path("index_data")
 EMBED_MODEL = "all-MiniLM-L6-v2"
-OLLAMA_URL = "http://localhost:11434/api/generate"
 MODEL_NAME = "phi3:latest"  # or the model you have pulled with ollama
 
-print("Loading index and metadata...")
-index = faiss.read_index("faiss_index.bin")
-texts = np.load("texts.npy", allow_pickle=True)
-meta = [json.loads(line) for line in open("meta.jsonl", "r", encoding="utf-8").read().splitlines()]
+# Semantic response cache: near-duplicate questions (cosine >= CACHE_THRESHOLD on the
+# retrieval embedding) that retrieve the same restaurants reuse the earlier reply
+CACHE_MAX_ENTRIES = int(os.environ.get("CHATBOT_CACHE_SIZE", "1024"))  # 0 disables the cache
+CACHE_TTL_SECONDS = float(os.environ.get("CHATBOT_CACHE_TTL", "3600"))
+CACHE_THRESHOLD = float(os.environ.get("CHATBOT_CACHE_THRESHOLD", "0.92"))
 
-print("Loading embedding model...")
-embedder = SentenceTransformer(EMBED_MODEL)
-print("✓ Embedding model loaded successfully")
+# Query embeddings: LRU cache by text (byte budget), micro-batched encoding of cache
+# misses (EMBED_MAX_BATCH of 1 disables it) and the SentenceTransformer backend:
+# "torch", "onnx", or "onnx-int8" for the dynamically quantised ONNX export on CPU
+EMBED_CACHE_BYTES = int(float(os.environ.get("CHATBOT_EMBED_CACHE_MB", "64")) * 1024 * 1024)
+EMBED_MAX_BATCH = int(os.environ.get("CHATBOT_EMBED_BATCH", "32"))
+EMBED_MAX_WAIT_MS = float(os.environ.get("CHATBOT_EMBED_WAIT_MS", "5"))
+EMBED_BACKEND = os.environ.get("CHATBOT_EMBED_BACKEND", "torch")
+EMBED_ONNX_INT8_FILE = os.environ.get("CHATBOT_EMBED_ONNX_FILE", "onnx/model_quint8_avx2.onnx")
+
+# Search-time overrides for approximate indexes (otherwise taken from manifest.json)
+SEARCH_PARAM_OVERRIDES = {
+    name: int(os.environ[env]) for name, env in (("nprobe", "CHATBOT_NPROBE"), ("efSearch", "CHATBOT_EF_SEARCH"))
+    if os.environ.get(env)
+}
+
+# build_index.py writes each build to its own version directory and points CURRENT at
+# it; the engine polls CURRENT every INDEX_POLL_SECONDS and swaps in new builds (0 disables)
+CURRENT_FILE = "CURRENT"
+INDEX_POLL_SECONDS = float(os.environ.get("CHATBOT_INDEX_POLL", "30"))
+
+# Record text and metadata stay in records.sqlite (memory-mapped up to this size) and
+# only the search hits are fetched
+RECORDS_MMAP_BYTES = int(float(os.environ.get("CHATBOT_RECORDS_MMAP_MB", "256")) * 1024 * 1024)
 
 SYSTEM_INSTRUCTION = (
     "You are a concise and helpful restaurant recommendation assistant. "
@@ -30,7 +57,7 @@ SYSTEM_INSTRUCTION = (
 
 PROMPT_TEMPLATE = """SYSTEM: {system}
 
-User: {user}
+{history}User: {user}
 
 Database records:
 {records}
@@ -38,87 +65,834 @@ Database records:
 A: 
 """
 
-def retrieve(user_query, top_k=5):
-    q_emb = embedder.encode([user_query], convert_to_numpy=True)
-    distances, idxs = index.search(q_emb, top_k)
-    results = []
-    for i in idxs[0]:
-        if i < 0 or i >= len(texts):
-            continue
-        results.append({
-            "text": texts[i],
-            "meta": meta[i]
-        })
-    return results
-
-def format_records_for_prompt(retrieved):
-    parts = []
-    for i, r in enumerate(retrieved, start=1):
-        m = r["meta"]
-        parts.append(
-            f"{i}. {m.get('name','')} | Cuisine: {m.get('cuisine_type','')} | "
-            f"Address: {m.get('address','')} | Price: {m.get('price_range','')} | "
-            f"Rating: {m.get('rating','')} | Atmosphere: {m.get('atmosphere','')} | Amenities: {m.get('amenities','')}"
-        )
-    return "\n".join(parts)
-
-def generate_reply(prompt, max_new_tokens=256, temperature=0.2):
+def load_sentence_transformer(model_name, backend=EMBED_BACKEND):
+    # ONNX Runtime backends need sentence-transformers >= 3.2 with the onnx extra; fall back to torch
+    from sentence_transformers import SentenceTransformer
+    if backend == "onnx":
+        kwargs = {"backend": "onnx"}
+    elif backend == "onnx-int8":
+        kwargs = {"backend": "onnx", "model_kwargs": {"file_name": EMBED_ONNX_INT8_FILE}}
+    else:
+        return SentenceTransformer(model_name)
     try:
-        response = requests.post(
-            OLLAMA_URL,
-            json={
-                "model": MODEL_NAME,
-                "prompt": prompt,
-                "stream": False,
-                "options": {
-                    "temperature": temperature,
-                    "num_predict": max_new_tokens,
-                    "top_p": 0.95
-                }
-            },
-            timeout=120
+        return SentenceTransformer(model_name, **kwargs)
+    except Exception as e:
+        print(f"Falling back to the torch embedder ({backend} backend unavailable: {e})")
+        return SentenceTransformer(model_name)
+
+# Cache key part: which restaurants the answer was grounded on
+def retrieved_place_ids(retrieved):
+    return frozenset(str(r["meta"].get("place_id", "")) for r in retrieved)
+
+
+# Hard constraints in a question (price, rating, cuisine, type, dietary, area) are
+# enforced before vector search instead of hoping the embedding honours them. Up to
+# FILTER_EXACT_ROWS matching records are scored exactly against the stored embeddings
+# (an approximate index can miss a handful of scattered matches); larger sets are
+# searched through the index with an IDSelector.
+FILTER_EXACT_ROWS = int(os.environ.get("CHATBOT_FILTER_EXACT_ROWS", "2048"))
+PRICE_RANGE_RE = re.compile(r"(\d+(?:\.\d+)?)\s*-\s*(\d+(?:\.\d+)?)")
+MAX_PRICE_RE = re.compile(r"\b(?:under|below|less than|cheaper than|up to|max(?:imum)?|within|no more than)\s*"
+                          r"(?:€\s*(\d+)|(\d+)\s*(?:euros?|eur)\b|(\d+)\b(?!\s*(?:\.\d|stars?)))")
+MIN_PRICE_RE = re.compile(r"\b(?:over|above|more than|at least)\s*(?:€\s*(\d+)|(\d+)\s*(?:euros?|eur)\b)")
+RATING_RE = re.compile(r"\b(?:rating|rated|stars?)\s*(?:of\s*)?(above|over|more than|greater than|at least|>=|>|"
+                       r"below|under|less than|lower than|at most|no more than|up to|<=|<)?\s*(\d(?:\.\d+)?)\s*(\+)?"
+                       r"(?:\s*(?:stars?\s*)?(or less|or lower|or below|and below|and under))?")
+# "under 4 stars", "4+ stars", "4 stars or less": comparator before the number, after it, or after "stars"
+STARS_RE = re.compile(r"(?:(?<!\w)(below|under|less than|lower than|at most|no more than|up to|<=|<)\s*)?"
+                      r"\b(\d(?:\.\d+)?)\s*(\+|or more|or higher|and up|and above)?\s*(?:stars?|rating)\b"
+                      r"(?:\s*(or less|or lower|or below|and below|and under))?")
+RATING_ABOVE = ("above", "over", "more than", "greater than", ">")
+RATING_BELOW = ("below", "under", "less than", "lower than", "<")
+RATING_AT_MOST = ("at most", "no more than", "up to", "<=", "or less", "or lower", "or below", "and below", "and under")
+CHEAP_WORDS = re.compile(r"\b(?:cheap|budget|affordable|inexpensive)\b")
+CHEAP_MAX_PRICE = 10
+AREA_STOPWORDS = {"cork", "co. cork", "ireland", "address not available"}
+# Types that are just ways of saying "somewhere to eat"; they never become a constraint
+GENERIC_TYPES = {"restaurant", "cafe", "pub", "bar"}
+
+
+def parse_price_range(value):
+    # "€10-25" -> (10.0, 25.0); missing or unparseable -> (nan, nan)
+    match = PRICE_RANGE_RE.search(str(value or ""))
+    return (float(match.group(1)), float(match.group(2))) if match else (np.nan, np.nan)
+
+
+def area_terms(address):
+    # Neighbourhood / street components of an address, without numbers, the city or the country
+    return [part.strip() for part in str(address or "").split(",")
+            if part.strip() and not re.search(r"\d", part) and part.strip().lower() not in AREA_STOPWORDS
+            and len(part.strip()) > 3]
+
+
+class RecordStore:
+    """Read-only access to the records.sqlite written by build_index.py.
+
+    Rows are keyed by FAISS id and ordered by "position" (the row in
+    embeddings.npy). Each thread gets its own connection.
+    """
+
+    def __init__(self, path, mmap_bytes=RECORDS_MMAP_BYTES):
+        self.path = Path(path)
+        if not self.path.exists():
+            raise FileNotFoundError(f"{self.path} not found; rebuild the index with build_index.py")
+        self.mmap_bytes = mmap_bytes
+        self._local = threading.local()
+        self.fields = [row[1] for row in self._conn().execute("PRAGMA table_info(records)")
+                       if row[1] not in ("faiss_id", "position", "text")]
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"{self.path.resolve().as_uri()}?mode=ro", uri=True)
+            conn.execute(f"PRAGMA mmap_size={self.mmap_bytes}")
+            self._local.conn = conn
+        return conn
+
+    def columns(self, names):
+        # Whole columns in position order, e.g. for building filter indexes
+        quoted = ", ".join(f'"{name}"' for name in names)
+        cursor = self._conn().execute(f"SELECT {quoted} FROM records ORDER BY position")
+        values = list(zip(*cursor.fetchall())) or [()] * len(names)
+        return {name: list(column) for name, column in zip(names, values)}
+
+    def fetch(self, faiss_ids):
+        # {"text", "meta"} for each id that exists, in the order given
+        faiss_ids = [int(fid) for fid in faiss_ids]
+        if not faiss_ids:
+            return []
+        quoted = ", ".join(f'"{field}"' for field in self.fields)
+        cursor = self._conn().execute(
+            f"SELECT faiss_id, text, {quoted} FROM records WHERE faiss_id IN ({', '.join('?' * len(faiss_ids))})",
+            faiss_ids,
         )
-        if response.status_code == 200:
-            result = response.json()
-            return result.get("response", "").strip()
-        else:
-            error_msg = f"Ollama API error: {response.status_code}"
-            print(error_msg)
-            return f"Error: {error_msg}"
-    except requests.exceptions.RequestException as e:
-        error_msg = f"Failed to connect to Ollama: {e}"
-        print(error_msg)
-        return "Error: Ollama service not running. Please start Ollama and try again."
+        found = {row[0]: {"text": row[1], "meta": dict(zip(self.fields, row[2:]))} for row in cursor}
+        return [found[fid] for fid in faiss_ids if fid in found]
 
-def get_chatbot_response(user_query, session_history=None, top_k=5):
-    user_context = ""
-    if session_history:
-        history_tail = session_history[-6:]
-        hist_text = []
-        for msg in history_tail:
-            role = msg.get("role", "user")
-            hist_text.append(f"{role.upper()}: {msg.get('text','')}")
-        user_context = "\n".join(hist_text)
-
-    retrieved = retrieve(user_context + "\n" + user_query, top_k=top_k)
-    records_block = format_records_for_prompt(retrieved) if retrieved else "No matching records found."
-
-    prompt = PROMPT_TEMPLATE.format(
-        system=SYSTEM_INSTRUCTION,
-        user=user_query,
-        records=records_block
+
+class MetaFilter:
+    """Column indexes over the record metadata, built once per loaded index.
+
+    parse() extracts hard constraints from a question; allowed_rows() turns them
+    into the rows satisfying all of them, using per-value row sets for the
+    categorical columns and arrays for rating and price. Values within one
+    column are alternatives ("Italian or Mexican"); columns are combined with AND.
+    """
+
+    # constraint name -> (meta field, how to split a field into indexed values)
+    CATEGORICAL = {
+        "cuisines": ("cuisine_type", lambda v: str(v or "").split(",")),
+        "types": ("restaurant_type", lambda v: str(v or "").split(",")),
+        "dietary": ("dietary_options", lambda v: str(v or "").split(",")),
+        "areas": ("address", area_terms),
+    }
+
+    FIELDS = ("rating", "price_range") + tuple(field for field, _ in CATEGORICAL.values())
+
+    # values that are indexed but never parsed out of a question
+    IGNORED = {"types": GENERIC_TYPES}
+
+    # When all constraints together match nothing they are dropped one group at a time,
+    # loosest first; area and cuisine are kept longest
+    RELAX_ORDER = (
+        ("types",),
+        ("min_rating", "rating_strict", "max_rating", "max_rating_strict"),
+        ("max_price", "min_price"),
+        ("dietary",),
+        ("cuisines",),
+        ("areas",),
     )
 
-    start = time.time()
-    reply = generate_reply(prompt, max_new_tokens=300, temperature=0.2)
-    latency = time.time() - start
+    def __init__(self, columns):
+        # columns: {field: values in row order} for every name in FIELDS
+        self.n_rows = len(columns["rating"])
+        self.rating = np.array([self._to_float(v) for v in columns["rating"]])
+        prices = np.array([parse_price_range(v) for v in columns["price_range"]]).reshape(-1, 2)
+        self.price_low, self.price_high = prices[:, 0], prices[:, 1]
+        self.rows = {}
+        self.patterns = {}
+        for name, (field, split) in self.CATEGORICAL.items():
+            rows = {}
+            for row, field_value in enumerate(columns[field]):
+                for value in split(field_value):
+                    value = value.strip().lower()
+                    if value:
+                        rows.setdefault(value, []).append(row)
+            self.rows[name] = {value: np.array(r, dtype="int64") for value, r in rows.items()}
+            # longest values first so "middle eastern" wins over a shorter overlapping term
+            terms = sorted(set(self.rows[name]) - self.IGNORED.get(name, set()), key=len, reverse=True)
+            self.patterns[name] = re.compile(r"\b(" + "|".join(map(re.escape, terms)) + r")s?\b") if terms else None
+
+    @staticmethod
+    def _to_float(value):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return np.nan
+
+    def parse(self, query):
+        text = query.lower()
+        constraints = {}
+        match = MAX_PRICE_RE.search(text)
+        if match:
+            value = float(next(g for g in match.groups() if g))
+            if value > 5 or "€" in match.group(0) or "eur" in match.group(0):  # small bare numbers are ratings
+                constraints["max_price"] = value
+        elif CHEAP_WORDS.search(text):
+            constraints["max_price"] = CHEAP_MAX_PRICE
+        match = MIN_PRICE_RE.search(text)
+        if match:
+            constraints["min_price"] = float(next(g for g in match.groups() if g))
+
+        match = RATING_RE.search(text)
+        if match and float(match.group(2)) <= 5:
+            self._rating_bound(constraints, float(match.group(2)), match.group(1) or match.group(4))
+        else:
+            match = STARS_RE.search(text)
+            if match and float(match.group(2)) <= 5:
+                self._rating_bound(constraints, float(match.group(2)), match.group(1) or match.group(4) or match.group(3))
+
+        for name, pattern in self.patterns.items():
+            found = sorted({m.group(1) for m in pattern.finditer(text)}) if pattern is not None else []
+            if found:
+                constraints[name] = found
+        return constraints
 
+    @staticmethod
+    def _rating_bound(constraints, value, comparator):
+        # "under"/"at most" words bound the rating from above; anything else from below
+        if comparator in RATING_BELOW or comparator in RATING_AT_MOST:
+            constraints["max_rating"] = value
+            constraints["max_rating_strict"] = comparator in RATING_BELOW
+        else:
+            constraints["min_rating"] = value
+            constraints["rating_strict"] = comparator in RATING_ABOVE
+
+    def allowed_rows(self, constraints):
+        # Row numbers satisfying every constraint, or None when there are no constraints
+        if not constraints:
+            return None
+        mask = np.ones(self.n_rows, dtype=bool)
+        with np.errstate(invalid="ignore"):
+            if "max_price" in constraints:
+                # a budget is met if the cheapest end of the range fits in it
+                mask &= self.price_low <= constraints["max_price"]
+            if "min_price" in constraints:
+                mask &= self.price_high >= constraints["min_price"]
+            if "min_rating" in constraints:
+                if constraints.get("rating_strict"):
+                    mask &= self.rating > constraints["min_rating"]
+                else:
+                    mask &= self.rating >= constraints["min_rating"]
+            if "max_rating" in constraints:
+                if constraints.get("max_rating_strict"):
+                    mask &= self.rating < constraints["max_rating"]
+                else:
+                    mask &= self.rating <= constraints["max_rating"]
+        for name in self.CATEGORICAL:
+            if name in constraints:
+                column = np.zeros(self.n_rows, dtype=bool)
+                for value in constraints[name]:
+                    column[self.rows[name].get(value, [])] = True
+                mask &= column
+        return np.flatnonzero(mask)
+
+    def relaxed_rows(self, constraints):
+        # allowed_rows(), relaxing constraints in RELAX_ORDER until some row matches;
+        # returns (rows, names of the dropped constraints)
+        constraints = dict(constraints)
+        dropped = []
+        rows = self.allowed_rows(constraints)
+        for group in self.RELAX_ORDER:
+            if rows is None or len(rows):
+                break
+            present = [name for name in group if name in constraints]
+            if not present:
+                continue
+            for name in present:
+                del constraints[name]
+            dropped += [name for name in present if not name.endswith("_strict")]
+            rows = self.allowed_rows(constraints)
+        return rows, dropped
+
+
+def filtered_search_params(search_params, allowed_ids):
+    # faiss search parameters restricting results to allowed_ids; the index's own
+    # nprobe / efSearch must be repeated because per-call parameters replace them
+    import faiss
+    selector = faiss.IDSelectorBatch(np.ascontiguousarray(allowed_ids, dtype="int64"))
+    if "nprobe" in search_params:
+        params = faiss.SearchParametersIVF(sel=selector, nprobe=search_params["nprobe"])
+    elif "efSearch" in search_params:
+        params = faiss.SearchParametersHNSW(sel=selector, efSearch=search_params["efSearch"])
+    else:
+        params = faiss.SearchParameters(sel=selector)
+    return params, selector
+
+def ollama_payload(prompt, max_new_tokens, temperature):
     return {
-        "reply": reply,
-        "retrieved": [r["meta"] for r in retrieved],
-        "latency_seconds": latency
+        "model": MODEL_NAME,
+        "prompt": prompt,
+        "options": {
+            "temperature": temperature,
+            "num_predict": max_new_tokens,
+            # the context builder budgets prompts for this window
+            "num_ctx": CONTEXT_TOKENS,
+            "top_p": 0.95
+        }
     }
 
+def generate_reply(prompt, max_new_tokens=256, temperature=0.2):
+    # Raises OllamaUnavailable when Ollama is down (after retries, or while the circuit is open)
+    result = ollama.generate(ollama_payload(prompt, max_new_tokens, temperature))
+    return result.get("response", "").strip()
+
+def generate_reply_stream(prompt, max_new_tokens=256, temperature=0.2):
+    # Same request streamed; Ollama answers one JSON object per line as tokens arrive
+    for chunk in ollama.stream(ollama_payload(prompt, max_new_tokens, temperature)):
+        if chunk.get("response"):
+            yield chunk["response"]
+
+class EmbeddingCache:
+    """LRU map from text to its embedding, bounded by the total bytes of stored vectors.
+
+    Keys are SHA-1 digests of the text, so long history-laden queries do not
+    have to be kept around just to look them up.
+    """
+
+    def __init__(self, max_bytes=EMBED_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # digest -> read-only vector, least recently used first
+        self.bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(text):
+        return hashlib.sha1(text.encode("utf-8")).digest()
+
+    def get(self, text):
+        key = self._key(text)
+        with self._lock:
+            vec = self.entries.get(key)
+            if vec is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return vec
+
+    def put(self, text, vec):
+        if vec.nbytes > self.max_bytes:
+            return
+        key = self._key(text)
+        vec = np.array(vec, dtype="float32")
+        vec.setflags(write=False)
+        with self._lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old.nbytes
+            self.entries[key] = vec
+            self.bytes += vec.nbytes
+            while self.bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.bytes -= evicted.nbytes
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else None,
+        }
+
+
+class EmbeddingBatcher:
+    """Encodes texts from concurrent callers together in one embedder.encode call.
+
+    Each caller blocks in submit(); a scheduler thread gathers requests for up
+    to `max_wait_ms` or until `max_batch_size` texts are waiting.
+    """
+
+    def __init__(self, engine, max_batch_size=EMBED_MAX_BATCH, max_wait_ms=EMBED_MAX_WAIT_MS):
+        self.engine = engine
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self.batches = 0
+        self.texts = 0
+
+    def submit(self, texts):
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="chatbot-embed-batcher", daemon=True)
+                self._thread.start()
+        future = Future()
+        self._queue.put((texts, future))
+        return future.result()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            n_texts = len(batch[0][0])
+            deadline = time.time() + self.max_wait
+            while n_texts < self.max_batch_size:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                n_texts += len(item[0])
+
+            # concurrent callers often miss on the same text; encode each distinct text once
+            texts = list(dict.fromkeys(text for item in batch for text in item[0]))
+            try:
+                vectors = self.engine.embedder.encode(texts, convert_to_numpy=True, batch_size=len(texts))
+            except Exception as e:
+                for item in batch:
+                    item[1].set_exception(e)
+                continue
+
+            self.batches += 1
+            self.texts += len(texts)
+            rows = {text: i for i, text in enumerate(texts)}
+            for item in batch:
+                item[1].set_result(vectors[[rows[text] for text in item[0]]])
+
+    def stats(self):
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "queue_depth": self._queue.qsize(),
+            "batches": self.batches,
+            "texts": self.texts,
+            "avg_batch_size": self.texts / self.batches if self.batches else None,
+        }
+
+class ResponseCache:
+    """Semantic cache of chatbot replies keyed on the retrieval query embedding.
+
+    A query reuses an earlier reply when the two embeddings have cosine
+    similarity >= `threshold` (searched in a small secondary FAISS index) and
+    retrieval returned exactly the same set of place_ids. Entries expire after
+    `ttl_seconds`, the least recently used are evicted beyond `max_entries`,
+    and invalidate() drops everything when the restaurant index changes.
+    """
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl_seconds=CACHE_TTL_SECONDS,
+                 threshold=CACHE_THRESHOLD, candidates=4):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self.candidates = candidates
+        self.entries = OrderedDict()  # entry id -> entry, least recently used first
+        self.index = None
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+        self.lookups = 0
+        self.hits = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    def _normalize(q_emb):
+        import faiss
+        vec = np.array(q_emb, dtype="float32").reshape(1, -1)
+        faiss.normalize_L2(vec)
+        return vec
+
+    def _remove(self, entry_id):
+        del self.entries[entry_id]
+        self.index.remove_ids(np.array([entry_id], dtype="int64"))
+
+    def lookup(self, q_emb, place_ids):
+        if self.max_entries <= 0:
+            return None
+        with self._lock:
+            self.lookups += 1
+            if not self.entries:
+                return None
+            scores, ids = self.index.search(self._normalize(q_emb), min(self.candidates, len(self.entries)))
+            now = time.time()
+            for score, entry_id in zip(scores[0], ids[0].tolist()):
+                entry = self.entries.get(entry_id)
+                if entry is None:
+                    continue
+                if now - entry["created"] > self.ttl_seconds:
+                    self._remove(entry_id)
+                    continue
+                if score >= self.threshold and entry["place_ids"] == place_ids:
+                    self.entries.move_to_end(entry_id)
+                    self.hits += 1
+                    self.saved_seconds += entry["latency_seconds"]
+                    return entry
+            return None
+
+    def put(self, q_emb, place_ids, reply, latency_seconds):
+        if self.max_entries <= 0:
+            return
+        import faiss
+        with self._lock:
+            vec = self._normalize(q_emb)
+            if self.index is None:
+                self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(vec.shape[1]))
+            entry_id = self._next_id
+            self._next_id += 1
+            self.index.add_with_ids(vec, np.array([entry_id], dtype="int64"))
+            self.entries[entry_id] = {
+                "place_ids": place_ids,
+                "reply": reply,
+                "latency_seconds": latency_seconds,
+                "created": time.time(),
+            }
+            while len(self.entries) > self.max_entries:
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def invalidate(self):
+        with self._lock:
+            self.entries.clear()
+            if self.index is not None:
+                self.index.reset()
+            self.invalidations += 1
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": self.hits / self.lookups if self.lookups else None,
+            "saved_seconds": self.saved_seconds,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+class ChatbotEngine:
+    """Vector index and embedder, each loaded on first use or by warm_up().
+
+    Importing this module is cheap; generation is delegated to Ollama, so the
+    engine is ready once the index and the embedding model are loaded.
+    """
+
+    COMPONENTS = ("index", "embedder")
+
+    def __init__(self, index_dir=".", embed_model=EMBED_MODEL, embed_backend=EMBED_BACKEND):
+        self.index_dir = Path(index_dir)
+        self.embed_model = embed_model
+        self.embed_backend = embed_backend
+        self.embedding_cache = EmbeddingCache()
+        self.embed_batcher = EmbeddingBatcher(self) if EMBED_MAX_BATCH > 1 else None
+        # no tokenizer for the Ollama model here, so prompt sizes are estimated
+        self.context = ContextBuilder()
+
+        self.index_data = None  # {version, index, manifest, search_params, records, ids, embeddings, filter}
+        self.embedder = None
+        self.response_cache = ResponseCache()
+
+        self.load_seconds = {}
+        self.errors = {}
+        self._locks = {name: threading.Lock() for name in self.COMPONENTS}
+        self._warm_up_thread = None
+        self._index_watcher = None
+        self._reload_lock = threading.Lock()
+
+    def _load(self, name, loader):
+        # Load a component once; concurrent callers wait for the first load
+        with self._locks[name]:
+            if name in self.load_seconds:
+                return
+            start = time.time()
+            try:
+                loader()
+            except Exception as e:
+                self.errors[name] = str(e)
+                raise
+            self.errors.pop(name, None)
+            self.load_seconds[name] = time.time() - start
+
+    def current_index_version(self):
+        # Version named by CURRENT, or None for an index written directly into index_dir
+        current = self.index_dir / CURRENT_FILE
+        return current.read_text(encoding="utf-8").strip() if current.exists() else None
+
+    def _read_index(self):
+        import faiss
+        version = self.current_index_version()
+        build_dir = self.index_dir / version if version else self.index_dir
+        index = faiss.read_index(str(build_dir / "faiss_index.bin"))
+        # manifest.json (written by build_index.py) says how the index must be queried;
+        # without one this is a legacy IndexFlatL2 over raw embeddings
+        manifest_path = build_dir / "manifest.json"
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8")) if manifest_path.exists() else None
+        search_params = dict((manifest or {}).get("search_params", {}))
+        search_params.update({k: v for k, v in SEARCH_PARAM_OVERRIDES.items() if k in search_params})
+        space = faiss.ParameterSpace()
+        for name, value in search_params.items():
+            space.set_index_parameter(index, name, value)
+        records = RecordStore(build_dir / "records.sqlite")
+        columns = records.columns(("faiss_id",) + MetaFilter.FIELDS)
+        embeddings_path = build_dir / "embeddings.npy"
+        normalized = bool((manifest or {}).get("normalized"))
+        return {
+            "version": version,
+            "index": index,
+            "manifest": manifest,
+            "search_params": search_params,
+            "records": records,
+            "ids": np.array(columns["faiss_id"], dtype="int64"),
+            # only normalised builds store vectors matching the index's inner-product scores
+            "embeddings": np.load(embeddings_path, mmap_mode="r") if normalized and embeddings_path.exists() else None,
+            "filter": MetaFilter(columns),
+        }
+
+    def load_index(self):
+        def loader():
+            print("Loading index and metadata...")
+            self.index_data = self._read_index()
+            # cached replies were grounded on the previous index
+            self.response_cache.invalidate()
+        self._load("index", loader)
+
+    def reload_index(self):
+        # Swap in the build CURRENT points to if it changed. The new index is read fully
+        # before the swap, and retrieve() works on the snapshot it started with.
+        if "index" not in self.load_seconds:
+            self.load_index()
+            return True
+        with self._reload_lock:
+            version = self.current_index_version()
+            if version == self.index_data["version"]:
+                return False
+            start = time.time()
+            self.index_data = self._read_index()
+            self.response_cache.invalidate()
+            self.load_seconds["index"] = time.time() - start
+            print(f"Reloaded index version {self.index_data['version']}")
+            return True
+
+    def start_index_watcher(self, interval=INDEX_POLL_SECONDS):
+        # Poll CURRENT on a daemon thread and hot-reload new builds
+        if interval <= 0 or self._index_watcher is not None:
+            return self._index_watcher
+
+        def watch():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.reload_index()
+                except Exception as e:
+                    print("Index reload failed:", e)
+
+        self._index_watcher = threading.Thread(target=watch, name="chatbot-index-watcher", daemon=True)
+        self._index_watcher.start()
+        return self._index_watcher
+
+    def load_embedder(self):
+        def loader():
+            print("Loading embedding model...")
+            self.embedder = load_sentence_transformer(self.embed_model, self.embed_backend)
+            print("✓ Embedding model loaded successfully")
+        self._load("embedder", loader)
+
+    def warm_up(self):
+        # Load every component now; failures are recorded in status() rather than raised
+        for loader in (self.load_index, self.load_embedder):
+            try:
+                loader()
+            except Exception as e:
+                print("Warm-up failed:", e)
+        return self.status()
+
+    def start_warm_up(self):
+        # Warm up on a daemon thread so the caller (e.g. API startup) is not blocked
+        if self._warm_up_thread is None:
+            self._warm_up_thread = threading.Thread(target=self.warm_up, name="chatbot-warm-up", daemon=True)
+            self._warm_up_thread.start()
+        return self._warm_up_thread
+
+    def is_ready(self):
+        return all(name in self.load_seconds for name in self.COMPONENTS)
+
+    def status(self):
+        return {
+            "ready": self.is_ready(),
+            "components": {name: name in self.load_seconds for name in self.COMPONENTS},
+            "load_seconds": dict(self.load_seconds),
+            "errors": dict(self.errors),
+            "index_version": self.index_data["version"] if self.index_data else None,
+        }
+
+    def embed(self, texts):
+        # Embeddings for `texts`, served from the LRU cache where possible; misses are
+        # encoded together with other callers' misses when the embed batcher is enabled
+        self.load_embedder()
+        vectors = [self.embedding_cache.get(text) for text in texts]
+        missing = [i for i, vec in enumerate(vectors) if vec is None]
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            if self.embed_batcher is not None:
+                encoded = self.embed_batcher.submit(missing_texts)
+            else:
+                encoded = self.embedder.encode(missing_texts, convert_to_numpy=True)
+            for i, vec in zip(missing, encoded):
+                vectors[i] = vec
+                self.embedding_cache.put(texts[i], vec)
+        return np.stack(vectors).astype("float32")
+
+    # Hard constraints in filter_query (default: user_query) restrict the search to the
+    # matching records; when nothing matches they are relaxed one at a time (see MetaFilter.RELAX_ORDER)
+    def retrieve(self, user_query, top_k=5, timings=None, return_embedding=False, filter_query=None):
+        self.load_index()
+        data = self.index_data
+        filter_start = time.time()
+        constraints = data["filter"].parse(user_query if filter_query is None else filter_query)
+        rows, relaxed = data["filter"].relaxed_rows(constraints)
+        if timings is not None:
+            timings["filter_seconds"] = time.time() - filter_start
+            timings["filter_matches"] = None if rows is None else len(rows)
+            timings["filter_relaxed"] = relaxed
+        start = time.time()
+        q_emb = self.embed([user_query])
+        if data["manifest"] and data["manifest"].get("normalized"):
+            import faiss
+            faiss.normalize_L2(q_emb)
+        embedded = time.time()
+        if rows is None or not len(rows):
+            distances, ids = data["index"].search(q_emb, top_k)
+        elif data["embeddings"] is not None and len(rows) <= FILTER_EXACT_ROWS:
+            scores = np.asarray(data["embeddings"][rows]) @ q_emb[0]
+            ids = data["ids"][rows[np.argsort(-scores, kind="stable")[:top_k]]][None, :]
+        else:
+            # the selector must stay referenced until the search has run
+            params, selector = filtered_search_params(data["search_params"], data["ids"][rows])
+            distances, ids = data["index"].search(q_emb, top_k, params=params)
+        if timings is not None:
+            timings["embed_seconds"] = embedded - start
+            timings["search_seconds"] = time.time() - embedded
+        results = data["records"].fetch(fid for fid in ids[0] if fid >= 0)
+        if return_embedding:
+            return results, q_emb
+        return results
+
+    def build_prompt(self, user_query, session_history=None, top_k=5, timings=None):
+        user_context = ""
+        if session_history:
+            history_tail = session_history[-6:]
+            hist_text = []
+            for msg in history_tail:
+                role = msg.get("role", "user")
+                hist_text.append(f"{role.upper()}: {msg.get('text','')}")
+            user_context = "\n".join(hist_text)
+
+        retrieved, q_emb = self.retrieve(user_context + "\n" + user_query, top_k=top_k, timings=timings,
+                                         return_embedding=True, filter_query=user_query)
+
+        # Fit records, older history (summarised) and room for the reply into CONTEXT_TOKENS
+        start = time.time()
+        # a question naming a known area ("cafes in Douglas") also gets the addresses
+        areas = "areas" in self.index_data["filter"].parse(user_query)
+        prompt, context_stats = self.context.build(PROMPT_TEMPLATE, SYSTEM_INSTRUCTION, user_query, retrieved,
+                                                   history=session_history, reply_tokens=REPLY_MAX_TOKENS,
+                                                   extra_fields=("address",) if areas else ())
+        if timings is not None:
+            timings["context_seconds"] = time.time() - start
+            timings.update(context_stats)
+        return prompt, retrieved, q_emb
+
+    def cached_reply(self, q_emb, retrieved, timings):
+        start = time.time()
+        entry = self.response_cache.lookup(q_emb, retrieved_place_ids(retrieved))
+        timings["cache_lookup_seconds"] = time.time() - start
+        return entry
+
+    def get_chatbot_response(self, user_query, session_history=None, top_k=5):
+        timings = {}
+        prompt, retrieved, q_emb = self.build_prompt(user_query, session_history, top_k=top_k, timings=timings)
+        cached = self.cached_reply(q_emb, retrieved, timings)
+        if cached is not None:
+            return {
+                "reply": cached["reply"],
+                "retrieved": [r["meta"] for r in retrieved],
+                "latency_seconds": timings["cache_lookup_seconds"],
+                "timings": timings,
+                "cached": True
+            }
+
+        start = time.time()
+        reply = generate_reply(prompt, max_new_tokens=REPLY_MAX_TOKENS, temperature=0.2)
+        latency = time.time() - start
+        timings["generate_seconds"] = latency
+        self.response_cache.put(q_emb, retrieved_place_ids(retrieved), reply, latency)
+
+        return {
+            "reply": reply,
+            "retrieved": [r["meta"] for r in retrieved],
+            "latency_seconds": latency,
+            "timings": timings,
+            "cached": False
+        }
+
+    def stream_chatbot_response(self, user_query, session_history=None, top_k=5):
+        # Yields ("retrieved", records), then ("token", text) per chunk, then ("done", summary)
+        timings = {}
+        prompt, retrieved, q_emb = self.build_prompt(user_query, session_history, top_k=top_k, timings=timings)
+        yield "retrieved", [r["meta"] for r in retrieved]
+
+        cached = self.cached_reply(q_emb, retrieved, timings)
+        if cached is not None:
+            yield "token", cached["reply"]
+            yield "done", {
+                "reply": cached["reply"],
+                "latency_seconds": timings["cache_lookup_seconds"],
+                "timings": timings,
+                "cached": True
+            }
+            return
+
+        start = time.time()
+        chunks = []
+        for chunk in generate_reply_stream(prompt, max_new_tokens=REPLY_MAX_TOKENS, temperature=0.2):
+            if not chunks:
+                timings["first_token_seconds"] = time.time() - start
+            chunks.append(chunk)
+            yield "token", chunk
+        latency = time.time() - start
+        timings["generate_seconds"] = latency
+        reply = "".join(chunks).strip()
+        self.response_cache.put(q_emb, retrieved_place_ids(retrieved), reply, latency)
+
+        yield "done", {
+            "reply": reply,
+            "latency_seconds": latency,
+            "timings": timings,
+            "cached": False
+        }
+
+# Shared Ollama connection pool and engine for this process; nothing is loaded until first use or warm_up()
+ollama = OllamaClient(OLLAMA_URL)
+engine = ChatbotEngine()
+
+def retrieve(user_query, top_k=5):
+    return engine.retrieve(user_query, top_k=top_k)
+
+def get_chatbot_response(user_query, session_history=None, top_k=5):
+    return engine.get_chatbot_response(user_query, session_history=session_history, top_k=top_k)
+
+def stream_chatbot_response(user_query, session_history=None, top_k=5):
+    return engine.stream_chatbot_response(user_query, session_history=session_history, top_k=top_k)
+
 if __name__ == "__main__":
     print("\n🧪 Testing chatbot engine...\n")
     test_q = "Recommend affordable Irish cafes in Cork with casual atmosphere and near Blackpool"
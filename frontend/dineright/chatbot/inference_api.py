@@ -1,13 +1,137 @@
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
+import asyncio
+import gc
+import json
+import math
+import os
+import threading
 import uuid
 import time
-from chatbot_engine import get_chatbot_response
+from concurrent.futures import ThreadPoolExecutor
+from chatbot_engine import engine, get_chatbot_response, ollama, stream_chatbot_response
+from ollama_client import OllamaError, OllamaUnavailable
+from session_store import make_session_store
 from fastapi.middleware.cors import CORSMiddleware
 
+# CHATBOT_PRELOAD=1 loads the index and embedder at import time; with a pre-forking
+# server (gunicorn --preload -k uvicorn.workers.UvicornWorker -w N inference_api:app)
+# workers then share them copy-on-write.
+PRELOAD = os.environ.get("CHATBOT_PRELOAD", "0") == "1"
+if PRELOAD:
+    engine.warm_up()
+    gc.freeze()
+
 app = FastAPI(title="Restaurant Chatbot Inference API")
 
+class InferencePool:
+    """Runs blocking engine calls on a bounded thread pool off the event loop.
+
+    At most `workers` calls run at once and at most `max_queue` more wait for a
+    slot; beyond that is_full() is true and the API answers 503 with a
+    Retry-After estimated from recent service times.
+    """
+
+    def __init__(self, workers, max_queue):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chat-worker")
+        self.pending = 0  # running + queued; only touched from the event loop thread
+        self.completed = 0
+        self.rejected = 0
+        self.avg_service_seconds = None
+
+    def is_full(self):
+        return self.pending >= self.workers + self.max_queue
+
+    def retry_after(self):
+        # Seconds until a slot is likely to free up, rounded up to a whole second
+        avg = self.avg_service_seconds or 1.0
+        return max(1, math.ceil(avg * (self.pending - self.workers + 1) / self.workers))
+
+    def _submit(self, loop, fn, *args, **kwargs):
+        # Queue fn on a worker. It counts as pending until it has left the executor, not
+        # until its caller stops waiting, so abandoned jobs still count against the bound.
+        submitted = time.time()
+
+        def timed_call():
+            started = time.time()
+            return fn(*args, **kwargs), started - submitted, time.time() - started
+
+        self.pending += 1
+        future = self.executor.submit(timed_call)
+        future.add_done_callback(lambda f: loop.is_closed() or loop.call_soon_threadsafe(self._finished, f))
+        return future
+
+    def _finished(self, future):
+        # Event loop thread: a job finished, failed, or was cancelled before it started
+        self.pending -= 1
+        if not future.cancelled() and future.exception() is None:
+            self._record(future.result()[2])
+
+    async def run(self, fn, *args, **kwargs):
+        # Returns (result, queue_seconds); callers check is_full() first. If the caller is
+        # cancelled while the job is still queued, the job is cancelled and never runs.
+        future = self._submit(asyncio.get_running_loop(), fn, *args, **kwargs)
+        result, queue_seconds, _ = await asyncio.wrap_future(future)
+        return result, queue_seconds
+
+    async def stream(self, fn, *args, **kwargs):
+        # Iterate a blocking generator on a worker, yielding its items as they arrive.
+        # If the consumer stops early the worker closes the generator at the next item (or
+        # skips it if it has not started); the job stays pending until the worker is done.
+        loop = asyncio.get_running_loop()
+        items = asyncio.Queue()
+        finished = object()
+        cancelled = threading.Event()
+
+        def produce():
+            generator = fn(*args, **kwargs)
+            try:
+                for item in generator:
+                    if cancelled.is_set():
+                        break
+                    loop.call_soon_threadsafe(items.put_nowait, item)
+            finally:
+                generator.close()
+                loop.call_soon_threadsafe(items.put_nowait, finished)
+
+        future = self._submit(loop, produce)
+        try:
+            while True:
+                item = await items.get()
+                if item is finished:
+                    break
+                yield item
+            await asyncio.wrap_future(future)
+        finally:
+            cancelled.set()
+            future.cancel()
+
+    def _record(self, service_seconds):
+        self.completed += 1
+        self.avg_service_seconds = (
+            service_seconds if self.avg_service_seconds is None
+            else 0.8 * self.avg_service_seconds + 0.2 * service_seconds
+        )
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "running": min(self.pending, self.workers),
+            "queued": max(0, self.pending - self.workers),
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_service_seconds": self.avg_service_seconds,
+        }
+
+pool = InferencePool(
+    workers=int(os.environ.get("CHAT_WORKERS", "4")),
+    max_queue=int(os.environ.get("CHAT_MAX_QUEUE", "8")),
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173"],  # React frontend
@@ -16,8 +140,35 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-SESSIONS = {}
-SESSION_TIMEOUT = 60 * 60 * 2
+# Store calls run in a thread so SQLite writes never block the event loop
+sessions = make_session_store()
+SESSION_SWEEP_SECONDS = float(os.environ.get("CHAT_SESSION_SWEEP", "60"))
+
+async def expire_sessions():
+    while True:
+        await asyncio.sleep(SESSION_SWEEP_SECONDS)
+        try:
+            await asyncio.to_thread(sessions.expire)
+        except Exception as e:
+            print("Session expiry failed:", e)
+
+@app.on_event("startup")
+async def warm_up_engine():
+    if not engine.is_ready():
+        engine.start_warm_up()
+    engine.start_index_watcher()
+    app.state.session_sweeper = asyncio.create_task(expire_sessions())
+
+@app.on_event("shutdown")
+async def close_ollama():
+    await asyncio.to_thread(ollama.close)
+
+def ollama_http_error(e):
+    # Ollama down or circuit open -> 503 with a retry hint; any other Ollama failure -> 502
+    if isinstance(e, OllamaUnavailable):
+        return HTTPException(status_code=503, detail="Model server unavailable, please retry.",
+                             headers={"Retry-After": str(max(1, math.ceil(e.retry_after or 1)))})
+    return HTTPException(status_code=502, detail=str(e))
 
 class ChatRequest(BaseModel):
     session_id: str | None = None
@@ -29,28 +180,101 @@ async def chat(req: ChatRequest):
     message = req.message.strip()
     if not message:
         raise HTTPException(status_code=400, detail="Message cannot be empty.")
-    if session_id not in SESSIONS:
-        SESSIONS[session_id] = {"history": [], "last_active": time.time()}
-    SESSIONS[session_id]["history"].append({"role": "user", "text": message})
-    SESSIONS[session_id]["last_active"] = time.time()
-    engine_out = get_chatbot_response(message, session_history=SESSIONS[session_id]["history"], top_k=5)
-    SESSIONS[session_id]["history"].append({"role": "assistant", "text": engine_out["reply"]})
-    SESSIONS[session_id]["last_active"] = time.time()
-    now = time.time()
-    stale = [sid for sid, s in SESSIONS.items() if now - s["last_active"] > SESSION_TIMEOUT]
-    for sid in stale:
-        del SESSIONS[sid]
+    if pool.is_full():
+        pool.rejected += 1
+        raise HTTPException(status_code=503, detail="Server busy, please retry.",
+                            headers={"Retry-After": str(pool.retry_after())})
+    started = time.time()
+    # The turn is stored only once it has a reply, so a failed generation leaves no dangling question
+    user_turn = {"role": "user", "text": message}
+    history = await asyncio.to_thread(sessions.get, session_id) + [user_turn]
+    try:
+        engine_out, queue_seconds = await pool.run(
+            get_chatbot_response, message, session_history=history, top_k=5
+        )
+    except OllamaError as e:
+        raise ollama_http_error(e)
+    await asyncio.to_thread(sessions.append, session_id, user_turn, {"role": "assistant", "text": engine_out["reply"]})
     return JSONResponse({
         "session_id": session_id,
         "reply": engine_out["reply"],
         "retrieved": engine_out["retrieved"],
-        "latency_seconds": engine_out["latency_seconds"]
+        "latency_seconds": engine_out["latency_seconds"],
+        "cached": engine_out["cached"],
+        "timings": {**engine_out["timings"], "queue_seconds": queue_seconds, "total_seconds": time.time() - started}
     })
 
+def sse_event(event, data):
+    # One Server-Sent Events frame
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream(req: ChatRequest):
+    # Same as /chat, but answers as Server-Sent Events: "retrieved" (records + session id)
+    # as soon as retrieval is done, then a "token" event per generated chunk, then "done"
+    session_id = req.session_id or str(uuid.uuid4())
+    message = req.message.strip()
+    if not message:
+        raise HTTPException(status_code=400, detail="Message cannot be empty.")
+
+    if pool.is_full():
+        pool.rejected += 1
+        raise HTTPException(status_code=503, detail="Server busy, please retry.",
+                            headers={"Retry-After": str(pool.retry_after())})
+    started = time.time()
+
+    user_turn = {"role": "user", "text": message}
+    history = await asyncio.to_thread(sessions.get, session_id) + [user_turn]
+
+    async def events():
+        try:
+            async for event, data in pool.stream(stream_chatbot_response, message, session_history=history, top_k=5):
+                if event == "retrieved":
+                    yield sse_event("retrieved", {"session_id": session_id, "retrieved": data})
+                elif event == "token":
+                    yield sse_event("token", {"text": data})
+                else:
+                    await asyncio.to_thread(sessions.append, session_id, user_turn,
+                                            {"role": "assistant", "text": data["reply"]})
+                    data["timings"]["total_seconds"] = time.time() - started
+                    yield sse_event("done", {"session_id": session_id, **data})
+        except OllamaUnavailable as e:
+            yield sse_event("error", {"detail": str(e), "retry_after": e.retry_after})
+        except Exception as e:
+            yield sse_event("error", {"detail": str(e)})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.get("/health")
 async def health():
     return {"status": "ok", "message": "Restaurant Chatbot API is running"}
 
+@app.get("/metrics")
+async def metrics():
+    return {
+        "pool": pool.stats(),
+        "sessions": await asyncio.to_thread(sessions.stats),
+        "ollama": ollama.stats(),
+        "response_cache": engine.response_cache.stats(),
+        "embedding_cache": engine.embedding_cache.stats(),
+        "embed_batcher": engine.embed_batcher.stats() if engine.embed_batcher else None
+    }
+
+@app.post("/admin/reload-index")
+async def reload_index():
+    # Swap in the latest build now instead of waiting for the watcher's next poll
+    try:
+        reloaded = await asyncio.to_thread(engine.reload_index)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Index reload failed: {e}")
+    return {"reloaded": reloaded, "index_version": engine.status()["index_version"]}
+
+@app.get("/ready")
+async def ready():
+    status = engine.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
 @app.get("/")
 async def root():
     return {
@@ -58,7 +282,11 @@ async def root():
         "version": "1.0",
         "endpoints": {
             "chat": "POST /chat",
-            "health": "GET /health"
+            "chat_stream": "POST /chat/stream",
+            "health": "GET /health",
+            "ready": "GET /ready",
+            "metrics": "GET /metrics",
+            "reload_index": "POST /admin/reload-index"
         }
     }
 
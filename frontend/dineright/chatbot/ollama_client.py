@@ -0,0 +1,334 @@
+# ollama_client.py
+# Pooled async HTTP client for the Ollama generate API.
+#
+# One httpx.AsyncClient (keep-alive connection pool) lives on a private event loop
+# thread, so the blocking chat workers share its connections instead of opening one per
+# reply. Every request has a deadline covering all of its attempts; connection errors,
+# timeouts and 5xx answers are retried with jittered exponential backoff while the
+# deadline allows. After CHATBOT_OLLAMA_BREAKER_FAILURES failed requests in a row the
+# circuit opens and calls fail fast with OllamaUnavailable for
+# CHATBOT_OLLAMA_BREAKER_RESET seconds; then one probe request decides whether it closes.
+import asyncio
+import json
+import os
+import queue
+import random
+import threading
+import time
+
+import httpx
+
+OLLAMA_URL = os.environ.get("OLLAMA_URL", "http://localhost:11434/api/generate")
+OLLAMA_DEADLINE_SECONDS = float(os.environ.get("CHATBOT_OLLAMA_TIMEOUT", "120"))
+OLLAMA_CONNECT_TIMEOUT = float(os.environ.get("CHATBOT_OLLAMA_CONNECT_TIMEOUT", "2"))
+OLLAMA_RETRIES = int(os.environ.get("CHATBOT_OLLAMA_RETRIES", "2"))
+OLLAMA_BACKOFF_SECONDS = float(os.environ.get("CHATBOT_OLLAMA_BACKOFF", "0.25"))
+OLLAMA_MAX_CONNECTIONS = int(os.environ.get("CHATBOT_OLLAMA_MAX_CONNECTIONS", "16"))
+OLLAMA_KEEPALIVE_SECONDS = float(os.environ.get("CHATBOT_OLLAMA_KEEPALIVE", "60"))
+BREAKER_FAILURES = int(os.environ.get("CHATBOT_OLLAMA_BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECONDS = float(os.environ.get("CHATBOT_OLLAMA_BREAKER_RESET", "30"))
+
+
+class OllamaError(Exception):
+    """Ollama answered, but not with a usable reply (e.g. 404 for a model that is not pulled)."""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class OllamaUnavailable(OllamaError):
+    """Ollama could not be reached in time, or the circuit breaker is open."""
+
+    def __init__(self, message, retry_after=None, status_code=None):
+        super().__init__(message, status_code)
+        self.retry_after = retry_after
+
+
+class _Retryable(Exception):
+    # One failed attempt that may be retried
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class CircuitBreaker:
+    """closed -> open after `failures` failed requests in a row -> half-open after
+    `reset_seconds`, when a single probe request is let through; its outcome closes
+    or re-opens the circuit."""
+
+    def __init__(self, failures=BREAKER_FAILURES, reset_seconds=BREAKER_RESET_SECONDS):
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.opened = 0
+        self.rejected = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def retry_after(self):
+        if self.state != "open":
+            return 0.0
+        return max(0.0, self.opened_at + self.reset_seconds - time.monotonic())
+
+    def allow(self):
+        # Returns True if a request may go out now
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = "half-open"
+                self._probing = False
+            if self.state == "closed":
+                return True
+            if self.state == "half-open" and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self._probing = False
+
+    def release(self):
+        # A request ended without saying anything about the server (e.g. it was cancelled)
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == "half-open" or self.consecutive_failures >= self.failures:
+                if self.state != "open":
+                    self.opened += 1
+                self.state = "open"
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "retry_after_seconds": self.retry_after(),
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
+
+
+class OllamaClient:
+    """Async client for one Ollama generate endpoint, with blocking wrappers.
+
+    generate_async()/stream_async() can be awaited from one event loop of the
+    caller's choosing; generate()/stream() are for worker threads and run the
+    same coroutines on the client's own loop thread. Use one style per client,
+    since the connection pool belongs to the loop that first used it.
+    """
+
+    def __init__(self, url=OLLAMA_URL, deadline_seconds=OLLAMA_DEADLINE_SECONDS,
+                 connect_timeout=OLLAMA_CONNECT_TIMEOUT, retries=OLLAMA_RETRIES,
+                 backoff_seconds=OLLAMA_BACKOFF_SECONDS, max_connections=OLLAMA_MAX_CONNECTIONS,
+                 keepalive_seconds=OLLAMA_KEEPALIVE_SECONDS, breaker=None):
+        self.url = url
+        self.deadline_seconds = deadline_seconds
+        self.connect_timeout = connect_timeout
+        self.retries = retries
+        self.backoff_seconds = backoff_seconds
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_connections,
+                                   keepalive_expiry=keepalive_seconds)
+        self.breaker = breaker or CircuitBreaker()
+        self.requests = 0
+        self.retried = 0
+        self.failed = 0
+        self._client = None
+        self._client_loop = None
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _http(self):
+        # The pool belongs to the loop that first uses it (the private loop for the blocking wrappers)
+        loop = asyncio.get_running_loop()
+        if self._client is None:
+            self._client = httpx.AsyncClient(limits=self.limits)
+            self._client_loop = loop
+        elif loop is not self._client_loop:
+            raise RuntimeError("OllamaClient is bound to another event loop")
+        return self._client
+
+    def _timeout(self, deadline):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise OllamaUnavailable(f"Ollama deadline of {self.deadline_seconds:.0f}s exceeded")
+        return httpx.Timeout(remaining, connect=min(self.connect_timeout, remaining))
+
+    def _deadline(self, deadline_seconds):
+        return time.monotonic() + (self.deadline_seconds if deadline_seconds is None else deadline_seconds)
+
+    async def _attempts(self, attempt, deadline):
+        # Run attempt(deadline) until it succeeds, a non-retryable error, or retries/deadline run out
+        if not self.breaker.allow():
+            raise OllamaUnavailable("Ollama is unavailable (circuit open)", retry_after=self.breaker.retry_after())
+        self.requests += 1
+        for n in range(self.retries + 1):
+            try:
+                result = await attempt(deadline)
+            except _Retryable as e:
+                delay = random.uniform(0, self.backoff_seconds * 2 ** n)
+                if n == self.retries or time.monotonic() + delay >= deadline:
+                    self.failed += 1
+                    self.breaker.record_failure()
+                    raise OllamaUnavailable(f"Ollama request failed: {e}", retry_after=self.breaker.retry_after() or None,
+                                            status_code=e.status_code) from e
+                self.retried += 1
+                await asyncio.sleep(delay)
+            except OllamaUnavailable:
+                self.failed += 1
+                self.breaker.record_failure()
+                raise
+            except OllamaError:
+                # Ollama answered (4xx, error chunk), so it is up
+                self.breaker.record_success()
+                raise
+            except BaseException:
+                self.breaker.release()
+                raise
+            else:
+                self.breaker.record_success()
+                return result
+
+    @staticmethod
+    def _check(response):
+        if response.status_code >= 500:
+            raise _Retryable(f"HTTP {response.status_code}", response.status_code)
+        if response.status_code != 200:
+            raise OllamaError(f"Ollama API error: {response.status_code}", response.status_code)
+
+    async def generate_async(self, payload, deadline_seconds=None):
+        # POST a non-streaming request; returns the decoded JSON reply
+        async def attempt(deadline):
+            try:
+                response = await self._http().post(self.url, json={**payload, "stream": False},
+                                                   timeout=self._timeout(deadline))
+            except httpx.TransportError as e:
+                raise _Retryable(repr(e)) from e
+            self._check(response)
+            return response.json()
+
+        return await self._attempts(attempt, self._deadline(deadline_seconds))
+
+    async def stream_async(self, payload, deadline_seconds=None):
+        # POST a streaming request; yields each NDJSON chunk. Only attempts that failed
+        # before their first chunk are retried, so a caller never sees text twice.
+        deadline = self._deadline(deadline_seconds)
+        chunks = asyncio.Queue()
+        done = object()
+
+        async def attempt(_):
+            sent = False
+            try:
+                async with self._http().stream("POST", self.url, json={**payload, "stream": True},
+                                               timeout=self._timeout(deadline)) as response:
+                    self._check(response)
+                    async for line in response.aiter_lines():
+                        if not line:
+                            continue
+                        if time.monotonic() > deadline:
+                            raise OllamaUnavailable(f"Ollama deadline of {self.deadline_seconds:.0f}s exceeded")
+                        chunk = json.loads(line)
+                        if chunk.get("error"):
+                            raise OllamaError(f"Ollama error: {chunk['error']}")
+                        sent = True
+                        chunks.put_nowait(chunk)
+                        if chunk.get("done"):
+                            break
+            except httpx.TransportError as e:
+                if not sent:
+                    raise _Retryable(repr(e)) from e
+                raise OllamaUnavailable(f"Ollama stream interrupted: {e!r}") from e
+            except _Retryable:
+                if sent:
+                    raise OllamaUnavailable("Ollama stream interrupted")
+                raise
+
+        async def run():
+            try:
+                await self._attempts(attempt, deadline)
+            finally:
+                chunks.put_nowait(done)
+
+        task = asyncio.ensure_future(run())
+        try:
+            while True:
+                chunk = await chunks.get()
+                if chunk is done:
+                    break
+                yield chunk
+            await task
+        finally:
+            if not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+
+    def _run_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="ollama-client", daemon=True)
+                self._thread.start()
+        return self._loop
+
+    def generate(self, payload, deadline_seconds=None):
+        # Blocking generate_async() for worker threads
+        future = asyncio.run_coroutine_threadsafe(self.generate_async(payload, deadline_seconds), self._run_loop())
+        try:
+            return future.result()
+        finally:
+            future.cancel()
+
+    def stream(self, payload, deadline_seconds=None):
+        # Blocking stream_async() for worker threads; closing the generator early
+        # cancels the request and returns its connection to the pool
+        items = queue.Queue()
+        done = object()
+
+        async def pump():
+            try:
+                async for chunk in self.stream_async(payload, deadline_seconds):
+                    items.put(chunk)
+            except Exception as e:
+                items.put(e)
+            finally:
+                items.put(done)
+
+        future = asyncio.run_coroutine_threadsafe(pump(), self._run_loop())
+        try:
+            while True:
+                item = items.get()
+                if item is done:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            future.cancel()
+
+    def close(self):
+        if self._loop is not None:
+            if self._client is not None:
+                asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop = self._client = self._thread = None
+
+    def stats(self):
+        return {
+            "url": self.url,
+            "requests": self.requests,
+            "retried": self.retried,
+            "failed": self.failed,
+            "breaker": self.breaker.stats(),
+        }